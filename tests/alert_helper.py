@@ -0,0 +1,187 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from tabulate import tabulate
+from . import ratelimit_helper
+from . import session_helper
+
+# asynchronous slack alerts: TestQEDHost.send_slack_message queues its alert here and
+# returns at once, so a failing check never waits on the network.  a background thread
+# gathers the alerts that arrive within coalesce_window seconds of the first one and sends
+# one post per hook, covering every server (and test) in the batch; a failure line already
+# sent for a server in the last repeat_window seconds is not sent again (though it is still
+# counted in the pages down), except in alerts queued with dedupe=False, such as the
+# monitor's up/down state changes, which are always sent in full.  posts to a hook
+# are spaced at least min_post_interval apart, and a post that fails (connection error or
+# an error status) is retried with exponential backoff, honoring Retry-After.  queued
+# alerts are flushed when the run ends (flush_timeout at most)
+
+coalesce_window = 10.0  # s alerts are gathered before a post
+repeat_window = 600.0  # s a line sent for a server is not repeated
+min_post_interval = 1.0  # s between posts to one hook (slack allows about one per second)
+max_attempts = 4  # tries per post
+retry_backoff = 2.0  # s before the first retry, doubled for each one after
+max_queued = 1000  # alerts waiting to be sent; more are dropped (and counted)
+flush_timeout = 30.0  # s allowed at exit (or in flush) for queued alerts to be sent
+
+
+def repeated_note(lines, pages_down):
+    # notes the lines left out of a post because they were sent earlier
+    return " ({} already reported)".format(pages_down - len(lines)) if pages_down > len(lines) else ""
+
+
+def slack_body(server_lines, counts=None):
+    # the slack message for one post from {server: [lines]}; a single server's alert keeps
+    # the format sent by TestQEDHost.send_slack_message, several servers get an attachment
+    # each.  counts gives a server's pages down where lines leaves out some sent earlier
+    counts = counts or {}
+    if len(server_lines) == 1:
+        server, lines = next(iter(server_lines.items()))
+        pages_down = counts.get(server, len(lines))
+        message = "\n".join(lines)
+        if pages_down <= 2:
+            return {"text": message}
+        if server is not None:
+            text = "There are *" + str(pages_down) + "* pages down on " + server
+        else:
+            text = "There are " + str(pages_down) + " pages down."
+        return {"text": text + repeated_note(lines, pages_down), "attachments": [{"text": message}]}
+    names = [server or "(no server)" for server in server_lines]
+    return {"text": "Alerts for *{}* servers: {}".format(len(names), ", ".join(names)),
+            "attachments": [{"title": name + repeated_note(lines, counts.get(server, len(lines))),
+                             "text": "\n".join(lines)}
+                            for name, (server, lines) in zip(names, server_lines.items())]}
+
+
+def post_json(hook_url, body):
+    # posts body to a slack webhook; returns the response
+    return session_helper.post(hook_url, data=json.dumps(body), headers={'Content-type': 'application/json'},
+                               timeout=10)
+
+
+class AlertQueue(object):
+    """
+    slack alerts sent from a background thread in coalesced, deduplicated, rate-limited posts
+    """
+
+    def __init__(self, window=None, post=None):
+        self.window = coalesce_window if window is None else window
+        self.post = post or post_json
+        self.stats = {"queued": 0, "dropped": 0, "duplicates": 0, "posts": 0, "retries": 0, "failed": 0}
+        self._queue = queue.Queue(max_queued)
+        self._flush = threading.Event()
+        self._sent = {}  # (hook, server, line) -> time sent
+        self._last_post = {}  # hook -> time of its last post
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, hook_url, message, server=None, dedupe=True):
+        # queues an alert and returns at once; the alert is dropped if the queue is full.
+        # with dedupe=False its lines are sent even if they were sent before
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alert sender", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((hook_url, server, message, dedupe))
+            self.stats["queued"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+        return
+
+    def flush(self, timeout=None):
+        # sends the queued alerts now, without waiting out the window; returns False if some
+        # were still unsent after timeout seconds
+        deadline = time.monotonic() + (flush_timeout if timeout is None else timeout)
+        self._flush.set()
+        try:
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            self._flush.clear()
+        return not self._queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            self._flush.wait(self.window)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception as e:  # the sender must keep running whatever happens
+                print("Alerts not sent: {}".format(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send(self, batch):
+        # one post per hook for a batch of (hook, server, message, dedupe) alerts
+        now = time.monotonic()
+        self._sent = dict((key, sent) for key, sent in self._sent.items() if now - sent < repeat_window)
+        hooks = OrderedDict()
+        counts = {}  # hook -> {server: distinct failure lines in the batch, sent before or not}
+        for hook_url, server, message, dedupe in batch:
+            server_lines = hooks.setdefault(hook_url, OrderedDict()).setdefault(server, [])
+            seen = counts.setdefault(hook_url, {}).setdefault(server, set())
+            for line in message.split("\n"):
+                if not dedupe:
+                    server_lines.append(line)  # e.g., down, back up, down again: all of them, in order
+                    continue
+                duplicate = line in seen
+                seen.add(line)
+                if duplicate or (hook_url, server, line) in self._sent:
+                    self.stats["duplicates"] += 1
+                else:
+                    server_lines.append(line)
+        for hook_url, server_lines in hooks.items():
+            server_lines = OrderedDict((server, lines) for server, lines in server_lines.items() if lines)
+            pages_down = dict((server, max(len(lines), len(counts[hook_url][server])))
+                              for server, lines in server_lines.items())
+            if server_lines and self._deliver(hook_url, slack_body(server_lines, pages_down)):
+                sent = time.monotonic()
+                for server, lines in server_lines.items():
+                    for line in lines:
+                        self._sent[(hook_url, server, line)] = sent
+        return
+
+    def _deliver(self, hook_url, body):
+        # posts body, spaced from the hook's last post and retried with backoff; returns success
+        delay = retry_backoff
+        for attempt in range(max_attempts):
+            wait = self._last_post.get(hook_url, -min_post_interval) + min_post_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_post[hook_url] = time.monotonic()
+            retry_after = None
+            try:
+                response = self.post(hook_url, body)
+                if response.status_code < 400:
+                    self.stats["posts"] += 1
+                    return True
+                retry_after = ratelimit_helper.retry_after_seconds(response.headers.get("Retry-After"))
+                error = "status {}".format(response.status_code)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+            if attempt + 1 < max_attempts:
+                self.stats["retries"] += 1
+                time.sleep(max(delay, retry_after or 0.0))
+                delay *= 2
+        self.stats["failed"] += 1
+        print("Alert to {} not sent after {} attempts ({})".format(hook_url, max_attempts, error))
+        return False
+
+    def report(self):
+        if self.stats["queued"] or self.stats["dropped"]:
+            print(tabulate([[self.stats[key] for key in sorted(self.stats)]], sorted(self.stats), tablefmt='grid'))
+        return
+
+
+alerts = AlertQueue()
+atexit.register(alerts.flush)
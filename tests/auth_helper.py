@@ -0,0 +1,172 @@
+import threading
+import time
+import mechanicalsoup  # for populating and submitting the login form
+from tabulate import tabulate
+from . import linkcheck_helper
+from . import session_helper
+from . import timing_helper
+
+# login-once browser cache for the pages that sit behind the qed login form; each server
+# gets one authenticated requests.Session (cookie jar) shared by a small pool of
+# mechanicalsoup browsers, so the login form is submitted once per server and again only
+# when a page comes back as the login form (e.g., the session expired).  pub serves its
+# "File Not Found" page for a missing page with a 200, so a logged-in page showing it is
+# given the status 404 (patch until the status code update goes live)
+
+login_form = 'form[name="auth"]'
+not_found_text = "File Not Found"
+
+
+class AuthenticatedBrowsers(object):
+    """
+    cache of logged-in sessions, one per server; open() returns the response for a page,
+    logging in first only when the server redirects to the login form.  counts logins
+    and the time spent on them and on page requests
+    """
+
+    def __init__(self, username, password, limited=True):
+        self.username = username
+        self.password = password
+        self.limited = limited  # rate limit the sessions per host (session_helper.build_session)
+        self.logins = 0
+        self.login_time = 0.0
+        self.pages = 0
+        self.page_time = 0.0
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _server(self, url):
+        # returns the per-server state: shared session, login lock, idle browsers, login count
+        key = session_helper.server_key(url)
+        with self._lock:
+            server = self._servers.get(key)
+            if server is None:
+                server = {"session": session_helper.build_session(limited=self.limited),
+                          "lock": threading.Lock(), "idle": [], "generation": 0}
+                self._servers[key] = server
+        return server
+
+    def _checkout(self, server):
+        with self._lock:
+            if server["idle"]:
+                return server["idle"].pop()
+        return mechanicalsoup.StatefulBrowser(session=server["session"], raise_on_404=False)
+
+    def _checkin(self, server, br):
+        with self._lock:
+            server["idle"].append(br)
+        return
+
+    @staticmethod
+    def needs_login(br):
+        # true when the current page is the login form
+        page = br.get_current_page()
+        return page is not None and page.select_one(login_form) is not None
+
+    def _login(self, br, server, url, generation):
+        # submits the login form; if another thread logged in while this one waited for
+        # the lock, the page is simply reopened with the refreshed cookies
+        with server["lock"]:
+            if server["generation"] != generation:
+                request_start = timing_helper.start()
+                response = br.open(url, timeout=linkcheck_helper.request_timeout)
+                session_helper.record_transfer(response, request_start)
+                if not self.needs_login(br):
+                    return response
+            start_time = time.time()
+            br.select_form(login_form)
+            br["username"] = self.username
+            br["password"] = self.password
+            request_start = timing_helper.start()
+            response = br.submit_selected(timeout=linkcheck_helper.request_timeout)
+            session_helper.record_transfer(response, request_start)
+            server["generation"] += 1
+            with self._lock:
+                self.logins += 1
+                self.login_time += time.time() - start_time
+        return response
+
+    def _open(self, br, server, url):
+        generation = server["generation"]
+        request_start = timing_helper.start()
+        response = br.open(url, timeout=linkcheck_helper.request_timeout)
+        session_helper.record_transfer(response, request_start)
+        if response.status_code < 400 and self.needs_login(br):
+            response = self._login(br, server, url, generation)
+        if response.status_code < 400 and not_found_text in response.text:
+            response.status_code = 404  # a missing page, served with a 200
+        return response
+
+    def open(self, url):
+        # returns the response for url, authenticating first if required
+        server = self._server(url)
+        br = self._checkout(server)
+        start_time = time.time()
+        try:
+            response = self._open(br, server, url)
+        finally:
+            self._checkin(server, br)
+            with self._lock:
+                self.pages += 1
+                self.page_time += time.time() - start_time
+        return response
+
+    def submit(self, url, form=1):
+        # opens url (authenticating first if required) and submits its form number 'form'
+        # with the default values already filled in; by default the second form on the
+        # page, skipping the search bar form.  returns the response to the submission
+        server = self._server(url)
+        br = self._checkout(server)
+        start_time = time.time()
+        try:
+            response = self._open(br, server, url)
+            if response.status_code < 400:
+                br.select_form(nr=form)
+                request_start = timing_helper.start()
+                response = br.submit_selected(timeout=linkcheck_helper.request_timeout)
+                session_helper.record_transfer(response, request_start)
+        finally:
+            self._checkin(server, br)
+            with self._lock:
+                self.pages += 1
+                self.page_time += time.time() - start_time
+        return response
+
+    def follow(self, url, step):
+        # opens url (authenticating first if required) and calls step(br) to act on the
+        # page with the same browser, e.g., to submit a form found in the page; returns
+        # step's response, or None when step finds nothing to act on
+        server = self._server(url)
+        br = self._checkout(server)
+        start_time = time.time()
+        try:
+            response = self._open(br, server, url)
+            if response.status_code < 400:
+                response = step(br)
+        finally:
+            self._checkin(server, br)
+            with self._lock:
+                self.pages += 1
+                self.page_time += time.time() - start_time
+        return response
+
+    def close(self):
+        with self._lock:
+            for server in self._servers.values():
+                server["session"].close()
+            self._servers.clear()
+        return
+
+    def report(self):
+        # prints the number of logins against pages opened, with time spent on each, and
+        # the connection reuse of the logged-in sessions (not among session_helper's)
+        if self.pages:
+            rows = [[self.pages, self.logins, round(self.page_time, 2), round(self.login_time, 2)]]
+            headers = ["pages opened", "logins", "total seconds", "login seconds"]
+            print(tabulate(rows, headers, tablefmt='grid'))
+        with self._lock:
+            items = sorted(self._servers.items())
+        rows = [[key + " (logged in)"] + session_helper.session_connections(server["session"])
+                for key, server in items]
+        session_helper.report_connections(rows)
+        return
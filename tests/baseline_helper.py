@@ -0,0 +1,47 @@
+import json
+import os
+
+# latency baseline for regression detection: a json file holding, per "server model"
+# group, the p95 page latency (seconds) of the last run in which every page passed.
+# a run is compared against it and groups whose p95 grew by more than
+# regression_percent are reported like an outage
+
+regression_percent = 25  # allowed p95 growth over the baseline, in percent
+min_regression_seconds = 0.25  # growth smaller than this is never flagged (noise on fast pages)
+
+
+def load(path):
+    # returns the stored baseline {group: p95 seconds}, or {} if there is none yet
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save(path, percentiles):
+    # merges the given groups into the baseline file (other servers' groups are kept)
+    baseline = load(path)
+    baseline.update(percentiles)
+    with open(path, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+    return
+
+
+def regressions(percentiles, baseline, percent=None):
+    # returns [(group, current p95, baseline p95)] for groups that regressed
+    if percent is None:
+        percent = regression_percent
+    found = []
+    for group in sorted(percentiles):
+        previous = baseline.get(group)
+        current = percentiles[group]
+        if previous and current > previous * (1 + percent / 100.0) \
+                and current - previous >= min_regression_seconds:
+            found.append((group, current, previous))
+    return found
+
+
+def regression_messages(found):
+    return tuple("Latency regression for: {}. p95 *{:.2f}s* against baseline *{:.2f}s* (+{:.0f}%).".format(
+                 group, current, previous, (current / previous - 1) * 100)
+                 for group, current, previous in found)
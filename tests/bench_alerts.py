@@ -0,0 +1,70 @@
+import time
+from tabulate import tabulate
+from . import alert_helper
+from . import stub_server
+
+# check of alert_helper.AlertQueue against the stub server's slack style webhook
+# run with:  python -m tests.bench_alerts
+# three servers fail together (two of them reported by two tests each): their alerts are
+# queued without blocking and arrive as one coalesced post, with repeated lines dropped;
+# the same failures queued again are not re-sent, while a server's up/down state changes
+# always are.  finally the hook refuses two posts with a 503 and the queue retries until
+# the alert is delivered
+
+
+def queue_failures(alerts, hook_url):
+    # alerts as check_response and check_output would queue them; returns seconds spent queuing
+    start_time = time.perf_counter()
+    alerts.put(hook_url, "Http response failed for: s1/sip\nHttp response failed for: s1/rice\n"
+                         "Http response failed for: s1/kabam", "http://s1/")
+    alerts.put(hook_url, "Http response failed for: s1/sip", "http://s1/")  # a second test, same page
+    alerts.put(hook_url, "http://s5/ is down!", "http://s5/")
+    alerts.put(hook_url, "http://s5/ is down!", "http://s5/")
+    alerts.put(hook_url, "Http response failed for: pub/sip", "http://pub/")
+    return time.perf_counter() - start_time
+
+
+def main():
+    server, base = stub_server.start()
+    hook_url = base + "/hooks/qed"
+    posts = stub_server.StubHandler.hook_posts
+    alerts = alert_helper.AlertQueue(window=0.5)
+    saved_backoff = alert_helper.retry_backoff
+    alert_helper.retry_backoff = 0.2
+    rows = []
+    try:
+        queued = queue_failures(alerts, hook_url)
+        alerts.flush()
+        assert len(posts) == 1 and len(posts[0][1]["attachments"]) == 3  # one post, one attachment per server
+        rows.append(["3 servers, 5 alerts", "{:.1f} ms".format(queued * 1000), len(posts), alerts.stats["duplicates"]])
+
+        queue_failures(alerts, hook_url)
+        alerts.flush()
+        assert len(posts) == 1  # every line was sent moments ago
+        rows.append(["same alerts again", "", len(posts), alerts.stats["duplicates"]])
+
+        for message in ("http://s5/ is down!", "http://s5/ is back up", "http://s5/ is down!"):
+            alerts.put(hook_url, message, "http://s5/", dedupe=False)
+            alerts.flush()
+        assert [body["text"] for path, body in posts[-3:]] == ["http://s5/ is down!", "http://s5/ is back up",
+                                                              "http://s5/ is down!"]
+        rows.append(["s5 flaps down, up, down", "", len(posts), alerts.stats["duplicates"]])
+
+        stub_server.StubHandler.hook_failures = 2
+        start_time = time.perf_counter()
+        alerts.put(hook_url, "Http response failed for: s1/iec", "http://s1/")
+        alerts.flush()
+        assert posts[-1][1]["text"] == "Http response failed for: s1/iec" and alerts.stats["retries"] == 2
+        rows.append(["hook answers 503 twice", "{:.2f} s to deliver".format(time.perf_counter() - start_time),
+                     len(posts), alerts.stats["duplicates"]])
+    finally:
+        alert_helper.retry_backoff = saved_backoff
+        server.shutdown()
+    print(tabulate(rows, ["scenario", "queue / delivery time", "posts received", "duplicates dropped"],
+                   tablefmt='grid'))
+    alerts.report()
+    return
+
+
+if __name__ == '__main__':
+    main()
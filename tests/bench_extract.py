@@ -0,0 +1,83 @@
+import sys
+import time
+from bs4 import BeautifulSoup
+from tabulate import tabulate
+from . import page_helper
+
+# parse-time benchmark for page_helper.parse_links against the BeautifulSoup approach
+# used previously by the page link tests (a full parse + find_all per region, once per test)
+# run with:  python -m tests.bench_extract [saved_page.html ...]
+# with no arguments a large ubertool-like page is generated twice: with the template
+# regions first, followed by a long body of model content (where the single pass stops
+# reading early), and with the regions after the body (where it must parse it all).  the
+# old approach is timed as the five tests ran it, one full parse per test and region
+
+
+def build_page(n_links=40, n_body_rows=20000, regions_last=False):
+    def anchors(prefix):
+        return "".join('<a href="/{}/{}">link {}</a>'.format(prefix, idx, idx) for idx in range(n_links))
+    regions = ('<div id="banner">' + anchors("banner") + '</div>'
+               '<div id="header_menu_r">' + anchors("header") + '</div>'
+               '<div class="left"><div class="menu">' + anchors("left") + '</div></div>'
+               '<div class="articles">' + anchors("articles") + '</div>'
+               '<div class="right">' + anchors("right") + '</div>')
+    body = ('<div class="content"><table>' +
+            "".join('<tr><td>row {}</td><td><a href="#r{}">x</a></td></tr>'.format(idx, idx)
+                    for idx in range(n_body_rows)) +
+            '</table></div>')
+    return ('<html><head><title>ubertool</title></head><body>' +
+            (body + regions if regions_last else regions + body) + '</body></html>')
+
+
+def soup_regions(html, regions=None):
+    soup_content = BeautifulSoup(html, "html.parser")
+    links = {}
+    for name, (attr, value) in (regions or page_helper.page_regions).items():
+        div_tags = soup_content.find_all('div', {attr: value})
+        links[name] = div_tags[0].find_all('a') if div_tags else []
+    return links
+
+
+def soup_tests(html):
+    # the old page link tests: each of the five parsed the whole page for its own region
+    links = {}
+    for name, region in page_helper.page_regions.items():
+        links.update(soup_regions(html, {name: region}))
+    return links
+
+
+def time_it(function, repeat=3):
+    best = None
+    for x in range(repeat):
+        start_time = time.time()
+        result = function()
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(paths):
+    pages = [(path, open(path, encoding="utf-8", errors="replace").read()) for path in paths]
+    if not pages:
+        pages = [("generated, regions first", build_page()),
+                 ("generated, regions last", build_page(regions_last=True))]
+    rows = []
+    for name, html in pages:
+        tests_time, tests_links = time_it(lambda: soup_tests(html))
+        soup_time, soup_links = time_it(lambda: soup_regions(html))
+        stream_time, stream_links = time_it(lambda: page_helper.parse_links(html))
+        for region in page_helper.page_regions:  # same anchors found every way
+            hrefs = [a.get('href') for a in stream_links[region]]
+            assert [a.get('href') for a in soup_links[region]] == hrefs
+            assert [a.get('href') for a in tests_links[region]] == hrefs
+        rows.append([name, len(html), round(tests_time, 3), round(soup_time, 3), round(stream_time, 4),
+                     "{:.0f}x".format(tests_time / max(stream_time, 1e-6)),
+                     "{:.1f}x".format(soup_time / max(stream_time, 1e-6))])
+    headers = ["page", "chars", "soup, 5 tests (s)", "soup, 1 parse (s)", "single pass (s)", "speedup vs 5 tests",
+               "speedup vs 1 parse"]
+    print(tabulate(rows, headers, tablefmt='grid'))
+    return
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+import time
+from tabulate import tabulate
+from . import linkcheck_helper
+from . import session_helper
+from . import stub_server
+
+# benchmark of linkcheck_helper.status_chk against local slow/fast stub servers
+# run with:  python -m tests.bench_linkcheck
+# the link list mimics an article section with 60 outbound links spread over a few
+# hosts, a handful of which hang for a couple of seconds.  a second comparison checks
+# a set of large references with plain GET's and with HEAD-first probing, reporting the
+# bytes received by each
+
+
+def build_links(base_urls, n_links=60, n_slow=6, slow_seconds=2):
+    links = []
+    for idx in range(n_links):
+        base = base_urls[idx % len(base_urls)]
+        if idx < n_slow:
+            link = base + "/slow/" + str(slow_seconds)
+        elif idx % 10 == 9:
+            link = base + "/status/404"
+        else:
+            link = base + "/fast"
+        links.append(link + "?link=" + str(idx))  # distinct url's, so none are served from the cache
+    return links
+
+
+def build_references(base_url, n_links=20, kb=256):
+    # large references, half of them served by a host that rejects HEAD
+    return [base_url + ("/nohead" if idx % 2 else "") + "/big/" + str(kb) + "?link=" + str(idx)
+            for idx in range(n_links)]
+
+
+def bytes_run(url_list, probe):
+    linkcheck_helper.status_cache.clear()
+    before = session_helper.transfer_stats()
+    linkcheck_helper.probe_mode = probe
+    try:
+        status = linkcheck_helper.status_chk(url_list)
+    finally:
+        linkcheck_helper.probe_mode = True
+    after = session_helper.transfer_stats()
+    return (after["header bytes"] + after["body bytes"]) - (before["header bytes"] + before["body bytes"]), status
+
+
+def time_run(url_list, **kwargs):
+    linkcheck_helper.status_cache.clear()
+    start_time = time.time()
+    status = linkcheck_helper.status_chk(url_list, **kwargs)
+    return time.time() - start_time, status
+
+
+def main():
+    servers = [stub_server.start() for x in range(3)]  # three hosts (distinct ports)
+    try:
+        links = build_links([base for server, base in servers])
+        serial_time, serial_status = time_run(links, max_workers=1)
+        concurrent_time, concurrent_status = time_run(links)
+        assert serial_status == concurrent_status  # same statuses, same order
+        rows = [["serial (max_workers=1)", len(links), round(serial_time, 2)],
+                ["concurrent (defaults)", len(links), round(concurrent_time, 2)]]
+        print(tabulate(rows, ["mode", "links", "seconds"], tablefmt='grid'))
+        print("speedup: {:.1f}x".format(serial_time / concurrent_time))
+        references = build_references(servers[0][1])
+        get_bytes, get_status = bytes_run(references, probe=False)
+        probe_bytes, probe_status = bytes_run(references, probe=True)
+        assert get_status == probe_status
+        rows = [["GET", len(references), get_bytes], ["HEAD-first probe", len(references), probe_bytes]]
+        print(tabulate(rows, ["mode", "links", "bytes received"], tablefmt='grid'))
+        session_helper.report_connections()
+    finally:
+        session_helper.close_all()
+        for server, base in servers:
+            server.shutdown()
+    return
+
+
+if __name__ == '__main__':
+    main()
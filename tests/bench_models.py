@@ -0,0 +1,145 @@
+import argparse
+import csv
+import json
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from . import auth_helper
+from . import stub_server
+from . import targets_helper
+
+# model execution benchmark: submits each model's default input form (as check_output and
+# te_st_qed_output_form do) N times, with a configurable number of concurrent submissions,
+# and records the time to the output page, throughput and error rate per model.  results
+# are printed and can be written as json and/or csv for sizing the backend workers
+# run with, e.g.:
+#   python -m tests.bench_models --server pub --runs 5 --concurrency 4 --json models.json
+#   python -m tests.bench_models --stub --runs 5 --concurrency 4   (local stand-in server)
+
+
+def output_ok(response):
+    # a run succeeds when it lands on a page whose model header is an output title
+    if response.status_code >= 400:
+        return False
+    soup = getattr(response, "soup", None)
+    header = soup.select_one('h2.model_header') if soup is not None else None
+    return header is not None and "Output" in header.get_text()
+
+
+def run_model(browsers, model, url, run):
+    start_time = time.perf_counter()
+    row = {"model": model.strip("/"), "run": run, "url": url, "start": start_time}
+    try:
+        response = browsers.submit(url)
+        row["status"] = response.status_code
+        row["ok"] = output_ok(response)
+        row["error"] = "" if row["ok"] else "no output page"
+    except Exception as e:
+        row["status"] = "Error"
+        row["ok"] = False
+        row["error"] = type(e).__name__
+    row["seconds"] = time.perf_counter() - start_time
+    return row
+
+
+def benchmark(browsers, input_pages, runs=3, concurrency=1):
+    # input_pages: [(model, input page url)]; returns (rows, wall seconds)
+    tasks = [(model, url, run) for run in range(runs) for model, url in input_pages]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        rows = list(pool.map(lambda task: run_model(browsers, *task), tasks))
+    return rows, time.perf_counter() - start_time
+
+
+def summarize(rows):
+    # per model: runs, errors, error rate, latency percentiles and throughput (successful
+    # runs per second over the time that model's runs were in progress)
+    summary = []
+    for model in sorted(set(row["model"] for row in rows)):
+        model_rows = [row for row in rows if row["model"] == model]
+        seconds = np.array([row["seconds"] for row in model_rows if row["ok"]])
+        errors = sum(1 for row in model_rows if not row["ok"])
+        window = max(row["start"] + row["seconds"] for row in model_rows) - min(row["start"] for row in model_rows)
+        entry = {"model": model, "runs": len(model_rows), "errors": errors,
+                 "error rate": round(errors / float(len(model_rows)), 3),
+                 "throughput per s": round((len(model_rows) - errors) / window, 3) if window > 0 else 0.0}
+        for name, value in zip(["mean s", "p50 s", "p95 s", "max s"],
+                               [seconds.mean(), np.percentile(seconds, 50), np.percentile(seconds, 95),
+                                seconds.max()] if len(seconds) else [np.nan] * 4):
+            entry[name] = round(float(value), 3)
+        summary.append(entry)
+    return summary
+
+
+def write_json(path, summary, rows, wall, settings):
+    with open(path, "w") as out:
+        json.dump({"settings": settings, "wall seconds": wall, "models": summary,
+                   "runs": [dict((k, v) for k, v in row.items() if k != "start") for row in rows]},
+                  out, indent=1)
+    return
+
+
+def write_csv(path, rows):
+    fields = ["model", "run", "url", "status", "ok", "error", "seconds"]
+    with open(path, "w", newline="") as out:
+        writer = csv.DictWriter(out, fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return
+
+
+def credentials(stub=False):
+    # (user, password) for the login form; the stub accepts any, so the decrypted
+    # smoketest_secrets module is only needed (and imported) for the real servers
+    if stub:
+        return "stub", "stub"
+    from . import smoketest_secrets
+    return smoketest_secrets.qed_user, smoketest_secrets.qed_pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark qed model runs (default input form submittal)")
+    parser.add_argument("--server", default="pub", help="pub, s1, s5 or a server url")
+    parser.add_argument("--models", help="comma separated models (default: models_nonbeta)")
+    parser.add_argument("--runs", type=int, default=3, help="submittals per model")
+    parser.add_argument("--concurrency", type=int, default=1, help="submittals in flight at once")
+    parser.add_argument("--json", help="write results to this json file")
+    parser.add_argument("--csv", help="write per-run results to this csv file")
+    parser.add_argument("--stub", action="store_true", help="run against a local stand-in server")
+    parser.add_argument("--stub-run-seconds", type=float, default=0.2, help="simulated model run time")
+    args = parser.parse_args(argv)
+
+    models = [m.strip() + "/" for m in args.models.split(",")] if args.models else targets_helper.models_nonbeta
+    models = [m.replace("//", "/") for m in models]
+    server = None
+    if args.stub:
+        stub_server.StubHandler.run_seconds = args.stub_run_seconds
+        server, base = stub_server.start()
+        root = base + "/secure/pram/"
+    else:
+        root = targets_helper.server_url(args.server) + "pram/"
+    user, password = credentials(args.stub)
+    browsers = auth_helper.AuthenticatedBrowsers(user, password, limited=False)
+    try:
+        input_pages = [(m, root + m + "input") for m in models]
+        rows, wall = benchmark(browsers, input_pages, args.runs, args.concurrency)
+    finally:
+        browsers.close()
+        if server is not None:
+            server.shutdown()
+    summary = summarize(rows)
+    headers = ["model", "runs", "errors", "error rate", "mean s", "p50 s", "p95 s", "max s", "throughput per s"]
+    print(tabulate([[entry[h] for h in headers] for entry in summary], headers, tablefmt='grid'))
+    print("{} runs in {:.2f}s ({:.2f} successful runs per second)".format(
+          len(rows), wall, sum(1 for row in rows if row["ok"]) / wall if wall else 0.0))
+    settings = {"root": root, "runs": args.runs, "concurrency": args.concurrency}
+    if args.json:
+        write_json(args.json, summary, rows, wall, settings)
+    if args.csv:
+        write_csv(args.csv, rows)
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from tabulate import tabulate
+
+# pool of headless browsers for the selenium based checks (testing_ground.TestQAQC);
+# up to 'size' browsers are started once and kept warm, handed out to checks running in
+# parallel, reset between uses, and all quit at the end (or at exit, whatever happens)
+
+
+class BrowserPool(object):
+    """
+    keeps up to 'size' webdriver instances made by factory(); browser() checks one out
+    (starting it if none is idle and the pool is not full, else waiting) and returns it
+    reset to a blank page with no cookies; run() maps a check over items in parallel
+    """
+
+    def __init__(self, factory, size=2):
+        self.factory = factory
+        self.size = size
+        self.startup_times = []  # seconds to start each browser
+        self.check_times = []  # seconds per check run through run()
+        self._idle = []
+        self._all = []  # every browser started (None for one starting), at most size
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # a browser was returned or a slot freed
+        self._closed = False
+        atexit.register(self.close)
+
+    def _acquire(self):
+        # an idle browser, else a new one if the pool is not full, else the next one returned
+        # (or started in a slot freed by a discarded browser)
+        with self._changed:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._all) < self.size:
+                    self._all.append(None)  # reserve the slot while the browser starts
+                    break
+                self._changed.wait()
+        start_time = time.perf_counter()
+        try:
+            browser = self.factory()
+        except Exception:
+            with self._changed:
+                self._all.remove(None)
+                self._changed.notify()
+            raise
+        with self._lock:
+            self._all[self._all.index(None)] = browser
+            self.startup_times.append(time.perf_counter() - start_time)
+        return browser
+
+    @staticmethod
+    def reset(browser):
+        # clears cookies (i.e., the login) and leaves the browser on a blank page
+        browser.delete_all_cookies()
+        browser.get("about:blank")
+        return
+
+    def _discard(self, browser):
+        with self._changed:
+            if browser in self._all:
+                self._all.remove(browser)
+            self._changed.notify()  # a waiting check may start a browser in the freed slot
+        try:
+            browser.quit()
+        except Exception:
+            pass
+        return
+
+    def _release(self, browser):
+        if self._closed:
+            return self._discard(browser)
+        try:
+            self.reset(browser)
+        except Exception:
+            return self._discard(browser)  # a broken browser is replaced on next demand
+        with self._changed:
+            self._idle.append(browser)
+            self._changed.notify()
+        return
+
+    @contextmanager
+    def browser(self):
+        browser = self._acquire()
+        try:
+            yield browser
+        finally:
+            self._release(browser)
+
+    def run(self, check, items):
+        # returns [check(browser, item) for item in items], with up to 'size' checks at once
+        def timed(item):
+            with self.browser() as browser:
+                start_time = time.perf_counter()
+                try:
+                    return check(browser, item)
+                finally:
+                    with self._lock:
+                        self.check_times.append(time.perf_counter() - start_time)
+        with ThreadPoolExecutor(max_workers=max(1, self.size)) as pool:
+            return list(pool.map(timed, items))
+
+    def close(self):
+        # quits every browser the pool started
+        with self._lock:
+            self._closed = True
+            browsers = [b for b in self._all if b is not None]
+            self._all = []
+            self._idle = []
+            self._changed.notify_all()
+        for browser in browsers:
+            try:
+                browser.quit()
+            except Exception:
+                pass
+        return
+
+    def report(self):
+        # prints browser startup time and per-check time
+        if self.startup_times or self.check_times:
+            rows = [["browser startup", len(self.startup_times), round(sum(self.startup_times), 2),
+                     round(max(self.startup_times or [0]), 2)],
+                    ["check", len(self.check_times), round(sum(self.check_times), 2),
+                     round(max(self.check_times or [0]), 2)]]
+            print(tabulate(rows, ["", "count", "total seconds", "max seconds"], tablefmt='grid'))
+        return
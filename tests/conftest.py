@@ -0,0 +1,82 @@
+import json
+from html import escape
+import pytest
+from . import sink_helper
+
+try:
+    import pytest_html
+except ImportError:  # optional; without it the sink's jsonl/junit files are the only detailed output
+    pytest_html = None
+
+# with pytest-html (python -m pytest --html=report.html) and QED_RESULTS_JSONL set, each
+# test's entry in the html report lists the results it reported: the rows of the tests
+# (and servers) it claimed (sink_helper.ResultSink.claim, by write_report and check_response).
+# the sweeps started by setUpClass write every server's rows while the first test runs, so
+# rows are matched by claim, not by when they were written; they are read back from the
+# jsonl file (from where this session started writing), failures first, up to html_rows
+
+html_rows = 500
+
+
+def pytest_sessionstart(session):
+    session.sink_start = sink_helper.sink.tell()
+    sink_helper.sink.claiming = pytest_html is not None and session.sink_start is not None
+    return
+
+
+def claimed(row, claims):
+    return any(row["test"] == test and str(row["target"]).startswith(prefix) for test, prefix in claims)
+
+
+def sink_rows(start, claims):
+    # the results written to the jsonl sink since offset 'start' that match claims, failures first
+    failed, passed = [], []
+    with open(sink_helper.jsonl_path) as results:
+        results.seek(start)
+        for line in results:
+            row = json.loads(line)
+            if not claimed(row, claims):
+                continue
+            (passed if row["passed"] else failed).append(row)
+            if len(failed) >= html_rows:
+                break
+            del passed[max(0, html_rows - len(failed)):]
+    return (failed + passed)[:html_rows]
+
+
+def rows_table(rows):
+    cells = "".join("<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                    *(escape(str(row.get(key, ""))) for key in ("target", "expected", "actual", "latency")))
+                    for row in rows)
+    return "<table><tr><th>target</th><th>expected</th><th>actual</th><th>seconds</th></tr>{}</table>".format(cells)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    # tells each unittest class that declares selected_tests which of its tests will run
+    # (after -k/-m deselection), so its setUpClass can skip work only deselected tests need
+    selected = {}
+    for item in items:
+        cls = getattr(item, "cls", None)
+        if cls is not None and hasattr(cls, "selected_tests"):
+            selected.setdefault(cls, set()).add(item.name)
+    for cls, names in selected.items():
+        cls.selected_tests = names
+    return
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    if pytest_html is None or sink_helper.sink.jsonl is None:
+        yield
+        return
+    if call.when == "setup":
+        sink_helper.sink.take_claims()  # drop any made outside a test's call phase
+    outcome = yield
+    report = outcome.get_result()
+    if call.when == "call":
+        claims = sink_helper.sink.take_claims()
+        rows = sink_rows(item.session.sink_start, claims) if claims else []
+        if rows:
+            report.extra = getattr(report, "extra", []) + [pytest_html.extras.html(rows_table(rows))]
+    return
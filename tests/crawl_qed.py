@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import json
+import math
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+from tabulate import tabulate
+from . import linkcheck_helper
+from . import page_helper
+from . import session_helper
+from . import stub_server
+from . import targets_helper
+
+# broken-link crawl of the qed sites: starting from the server roots, pages on the roots'
+# hosts are fetched and every link on them is resolved, normalized and checked, breadth
+# first, up to max_depth links away from a root.  links to other hosts, and pages at the
+# depth limit, are checked (linkcheck_helper.fetch_status, HEAD first) but not followed.
+# urls are queued once: a seen-set of url digests (8 bytes each), or a bloom filter of
+# fixed size for very large crawls, remembers every url queued, and max_links caps the
+# total, so memory stays bounded.  run with, e.g.:
+#   python -m tests.crawl_qed --server pub --max-depth 3 --json broken.json
+#   python -m tests.crawl_qed --stub                  (local stand-in site)
+# the exit status is 1 when broken links are found, so a ci job fails on them
+
+max_depth = 3
+max_pages = 2000  # pages fetched and parsed for links
+max_links = 20000  # urls checked in all (pages included)
+crawl_workers = 16
+
+
+def url_digest(url):
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+
+
+class SeenSet(object):
+    """
+    exact set of the urls queued so far, kept as 8 byte digests
+    """
+
+    def __init__(self):
+        self._digests = set()
+
+    def add(self, url):
+        # adds url; returns False if it was already there
+        digest = url_digest(url)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        return True
+
+    def __len__(self):
+        return len(self._digests)
+
+    def describe(self):
+        return "exact ({} urls)".format(len(self))
+
+
+class BloomSeenSet(object):
+    """
+    bloom filter of the urls queued so far: fixed memory for 'capacity' urls; a url that
+    was not queued is taken for a seen one (and skipped) with probability about error_rate
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.bits / float(capacity) * math.log(2))))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def add(self, url):
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        positions = [(first + i * second) % self.bits for i in range(self.hashes)]
+        if all(self._array[p >> 3] & (1 << (p & 7)) for p in positions):
+            return False
+        for p in positions:
+            self._array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def describe(self):
+        return "bloom ({} urls, {} kB)".format(self.count, len(self._array) // 1024)
+
+
+def is_broken(status):
+    return not isinstance(status, int) or status >= 400
+
+
+class Crawler(object):
+    """
+    breadth-first crawl from roots, checking every discovered link concurrently; broken
+    holds (url, status, page it was found on) for each broken link
+    """
+
+    def __init__(self, roots, depth=max_depth, pages=max_pages, links=max_links, workers=crawl_workers,
+                 seen=None):
+        self.scope = set(linkcheck_helper.host_key(root) for root in roots)
+        self.max_depth = depth
+        self.max_pages = pages
+        self.max_links = links
+        self.workers = workers
+        self.seen = seen if seen is not None else SeenSet()
+        self.frontier = deque()  # (url, depth, page it was found on)
+        self.broken = []
+        self.stats = {"pages": 0, "checked": 0, "offsite": 0, "skipped": 0, "seconds": 0.0}
+        for root in roots:
+            self.enqueue(linkcheck_helper.normalize_url(root), 0, "")
+
+    def enqueue(self, url, depth, found_on):
+        if not self.seen.add(url):
+            return
+        if len(self.seen) > self.max_links:
+            self.stats["skipped"] += 1
+            return
+        self.frontier.append((url, depth, found_on))
+        return
+
+    def in_scope(self, url):
+        return linkcheck_helper.host_key(url) in self.scope
+
+    def visit(self, url, depth, expand):
+        # returns (status, links found) for url; pages are fetched and parsed if expand
+        if not expand:
+            return linkcheck_helper.fetch_status(url), []
+        try:
+            response = session_helper.get(url, stream=True, timeout=linkcheck_helper.request_timeout)
+        except Exception:
+            return 999, []
+        if response.status_code != 200 or "html" not in response.headers.get("Content-Type", "") \
+                or not self.in_scope(response.url):  # e.g., redirected off site
+            response.close()
+            session_helper.record_transfer(response)
+            return response.status_code, []
+        base, hrefs = page_helper.page_links(response)
+        base = urljoin(response.url, base) if base else response.url
+        return response.status_code, [link for link in (linkcheck_helper.resolve_url(base, href) for href in hrefs) if link]
+
+    def run(self):
+        start_time = time.perf_counter()
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while self.frontier or pending:
+                while self.frontier and len(pending) < 2 * self.workers:
+                    url, depth, found_on = self.frontier.popleft()
+                    expand = self.in_scope(url) and depth < self.max_depth and self.stats["pages"] < self.max_pages
+                    if expand:
+                        self.stats["pages"] += 1
+                    elif not self.in_scope(url):
+                        self.stats["offsite"] += 1
+                    pending[pool.submit(self.visit, url, depth, expand)] = (url, depth, found_on)
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth, found_on = pending.pop(future)
+                    status, links = future.result()
+                    self.stats["checked"] += 1
+                    if is_broken(status):
+                        self.broken.append((url, status, found_on))
+                    for link in links:
+                        self.enqueue(link, depth + 1, url)
+        self.stats["seconds"] = time.perf_counter() - start_time
+        return self.broken
+
+    def report(self):
+        rows = [[", ".join(sorted(self.scope)), self.stats["pages"], self.stats["checked"], self.stats["offsite"],
+                 len(self.broken), self.stats["skipped"], self.seen.describe(), round(self.stats["seconds"], 2)]]
+        headers = ["hosts", "pages crawled", "links checked", "off site", "broken", "over link limit",
+                   "seen set", "seconds"]
+        print(tabulate(rows, headers, tablefmt='grid'))
+        if self.broken:
+            print(tabulate(sorted(self.broken), ["broken link", "status", "found on"], tablefmt='grid'))
+        return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="crawl the qed sites for broken links")
+    parser.add_argument("--server", action="append", help="pub, s1, s5 or a root url (repeatable; "
+                                                          "default: the TestQEDHost servers)")
+    parser.add_argument("--stub", action="store_true", help="crawl a local stand-in site")
+    parser.add_argument("--max-depth", type=int, default=max_depth)
+    parser.add_argument("--max-pages", type=int, default=max_pages)
+    parser.add_argument("--max-links", type=int, default=max_links)
+    parser.add_argument("--workers", type=int, default=crawl_workers)
+    parser.add_argument("--bloom", action="store_true", help="use a bloom filter (sized for --max-links) "
+                                                             "as the seen-set")
+    parser.add_argument("--json", help="write the broken link map to this json file")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.stub:
+        server, base = stub_server.start()
+        roots = [base + "/site"]
+    else:
+        roots = [targets_helper.server_url(name) for name in (args.server or targets_helper.suite_servers("host"))]
+    seen = BloomSeenSet(args.max_links) if args.bloom else None
+    crawler = Crawler(roots, args.max_depth, args.max_pages, args.max_links, args.workers, seen)
+    try:
+        crawler.run()
+    finally:
+        if server is not None:
+            server.shutdown()
+    crawler.report()
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"roots": roots, "stats": crawler.stats,
+                       "broken": [{"url": url, "status": status, "found on": found_on}
+                                  for url, status, found_on in sorted(crawler.broken)]}, out, indent=1)
+    return crawler.broken
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)  # a non-zero exit status when broken links were found
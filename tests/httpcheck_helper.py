@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from tabulate import tabulate
+from . import session_helper
+from . import timing_helper
+
+# browser-free versions of the selenium click/submit checks (testing_ground): the page is
+# opened with the logged-in mechanicalsoup browsers (auth_helper) and the request that a
+# click would make is found in the page html - the form around a submit button, a link,
+# or a location assignment in the element's onclick handler or in an inline script click
+# handler bound to the element's id - and sent directly.  when the request cannot be found that
+# way (it is built by javascript) the check returns None and run_checks hands that page
+# to the browser pool instead
+
+http_workers = 8
+location_pattern = re.compile(r"""(?:location(?:\.href)?\s*=|location\.(?:assign|replace)\(|window\.open\()"""
+                              r"""\s*['"]([^'"]+)['"]""")
+# a click handler bound in script: getElementById('id') or $('#id') / jQuery('#id'), then
+# .onclick =, .addEventListener('click', .on('click' or .click(
+handler_pattern = r"""(?:getElementById\(\s*['"]{0}['"]\s*\)|(?:\$|jQuery)\(\s*['"]#{0}['"]\s*\))\s*\.\s*""" \
+                  r"""(?:onclick\s*=|addEventListener\(\s*['"]click['"]|on\(\s*['"]click['"]|click\()"""
+any_handler_pattern = re.compile(handler_pattern.format(r"[^'\"]+"))
+
+_lock = threading.Lock()
+_stats = {"http": 0, "browser": 0, "http_time": 0.0, "browser_time": 0.0}
+
+
+def is_submit(element):
+    if element.name == "button":
+        return element.get("type", "submit").lower() == "submit"
+    return element.name == "input" and element.get("type", "").lower() in ("submit", "image")
+
+
+def script_location(page, element):
+    # url assigned to window.location (or opened) by a click handler for element: its
+    # onclick attribute, or a handler bound to its id in an inline script (the script from
+    # the binding up to the next handler bound to any element).  None when there is no
+    # such handler, or the handlers could go to more than one url, e.g., if/else
+    location = location_pattern.search(element.get("onclick", ""))
+    if location:
+        return location.group(1)
+    if not element.get("id"):
+        return None
+    bound = re.compile(handler_pattern.format(re.escape(element["id"])))
+    locations = set()
+    for script in page.find_all("script"):
+        text = script.string or ""
+        for binding in bound.finditer(text):
+            following = any_handler_pattern.search(text, binding.end())
+            handler = text[binding.end():following.start() if following else len(text)]
+            locations.update(location.group(1) for location in location_pattern.finditer(handler))
+    return locations.pop() if len(locations) == 1 else None
+
+
+def find_action(page, element):
+    # what clicking element does: ("form", form, submit button), ("link", href) or None
+    if element is None:
+        return None
+    href = element.get("href", "") if element.name == "a" else ""
+    if href and not href.startswith(("#", "javascript:")):
+        return "link", href
+    location = script_location(page, element)
+    if location:
+        return "link", location
+    form = element.find_parent("form")
+    if form is None and element.get("form"):
+        form = page.find("form", id=element["form"])
+    if form is not None and is_submit(element):
+        return "form", form, element
+    return None
+
+
+def follow_action(br, action):
+    # sends the request found by find_action from the page br is on
+    request_start = timing_helper.start()
+    if action[0] == "form":
+        br.select_form(action[1])
+        response = br.submit_selected(btnName=action[2])
+    else:
+        response = br.open(urljoin(br.url, action[1]))
+    session_helper.record_transfer(response, request_start)
+    return response
+
+
+def click_step(selector):
+    # step for AuthenticatedBrowsers.follow: does over http what a click on the element
+    # matched by the css selector does, or returns None if that takes javascript
+    def step(br):
+        page = br.get_current_page()
+        action = find_action(page, page.select_one(selector)) if page is not None else None
+        return follow_action(br, action) if action is not None else None
+    return step
+
+
+def run_checks(http_check, browser_check, items, browsers=None, workers=http_workers):
+    # returns [result per item]: http_check(item) runs for every item in parallel, and
+    # the items it returns None for are checked with browser_check(browser, item) on the
+    # browser pool (which starts its browsers only if that happens)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(http_check, items))
+    http_time = time.perf_counter() - start_time
+    pending = [i for i, result in enumerate(results) if result is None]
+    start_time = time.perf_counter()
+    if pending:
+        for i, result in zip(pending, browsers.run(browser_check, [items[i] for i in pending])):
+            results[i] = result
+    with _lock:
+        _stats["http"] += len(items) - len(pending)
+        _stats["browser"] += len(pending)
+        _stats["http_time"] += http_time
+        _stats["browser_time"] += time.perf_counter() - start_time
+    return results
+
+
+def report():
+    # prints how many checks ran over http and how many needed the browser
+    with _lock:
+        stats = dict(_stats)
+    if stats["http"] or stats["browser"]:
+        rows = [["http", stats["http"], round(stats["http_time"], 2)],
+                ["browser", stats["browser"], round(stats["browser_time"], 2)]]
+        print(tabulate(rows, ["checked with", "pages", "seconds"], tablefmt='grid'))
+    return
@@ -1,32 +1,223 @@
-import requests
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit, urlunsplit
 from tabulate import tabulate
+from . import cache_helper
+from . import ratelimit_helper
+from . import session_helper
+from . import sink_helper
+from . import store_helper
+from . import timing_helper
+
+# limits used by status_chk when checking a list of url's concurrently
+max_in_flight = 16  # global cap on requests in flight at any one time
+max_per_host = 4  # cap on simultaneous connections to a single host
+request_timeout = 10  # seconds allowed per request (connect and read)
+
+# probe mode: send HEAD first and only fall back to a GET (streamed, and closed as soon
+# as the headers arrive) when the server rejects HEAD; avoids downloading page bodies,
+# pdf's, etc. just to read a status code
+probe_mode = True
+head_rejected = (405, 501)
+
+# process-wide cache of url statuses; the banner/header/column links are template links
+# repeated on every page and server, so each (normalized) url is fetched at most once
+# per run.  entries expire after cache_ttl seconds; least recently used are evicted first
+cache_ttl = 600
+cache_entries = 10000
+status_cache = cache_helper.ResultCache(cache_ttl, cache_entries)
+default_ports = {"http": 80, "https": 443}
+resolve_cache_size = 10000  # (base url, href) pairs memoized by resolve_url
+
+# optional on-disk result store (sqlite file named by QED_RESULT_STORE); every check is
+# recorded there.  with QED_INCREMENTAL=1, url's that passed less than store_max_age
+# seconds ago are not requested at all, and the rest are re-checked with conditional
+# requests, so the link suites can be run every few minutes without hammering the servers
+store_path = os.environ.get("QED_RESULT_STORE")
+result_store = store_helper.ResultStore(store_path) if store_path else None
+incremental = os.environ.get("QED_INCREMENTAL") == "1"
+store_max_age = 3600
 
 
 def build_http_links(root_url, href_list):
-    # function receives root_url (e.g., http://qed.epa.gov) and a list of link references
-    # from a qed page (representing e.g., the list of models, links to other sites, etc.)
-    # function processes the list of link references and builds a complete url
-    url_list = [""] * len(href_list)
-    for idx, link in enumerate(href_list):
-        url_list[idx] = link.get('href')
-        if not url_list[idx]:  #check to ensure a link is actually populated
-            url_list[idx] = "No link available"
-        elif url_list[idx][0:4] == 'http':
-            url_list[idx] = url_list[idx]
-        elif (url_list[idx][0] == '/'):
-            url_list[idx] = root_url + url_list[idx]
-        else:
-            url_list[idx] = root_url + '/ubertool' + '/' + url_list[idx]
+    # function receives the url a page's links are relative to (the page's url or its
+    # <base href>, e.g., page_helper.extract_links(...).base; a bare server root such as
+    # http://qed.epa.gov stands for its /ubertool/ page) and a list of link references
+    # (anchor attribute dicts) from the page, and returns the distinct complete url's they
+    # point to, in page order (see resolve_url); links that aren't http(s) (mailto:,
+    # javascript:, ...) are left out, and a link without an href is "No link available"
+    base = root_url
+    if urlsplit(root_url).path in ("", "/"):
+        base = root_url.rstrip("/") + "/ubertool/"
+    url_list = []
+    seen = set()
+    for link in href_list:
+        href = link.get('href')
+        if not href:  #check to ensure a link is actually populated
+            url_list.append("No link available")
+            continue
+        url = resolve_url(base, href)
+        if url is not None and url not in seen:  # e.g., #anchor variants of one page
+            seen.add(url)
+            url_list.append(url)
     return url_list
 
-def status_chk(url_list):
+@lru_cache(maxsize=resolve_cache_size)
+def resolve_url(base, href):
+    # returns the canonical absolute url for an href found on a page with base url 'base':
+    # relative references are resolved as a browser would (../, ?query, //host/path), the
+    # fragment is dropped and the url normalized (normalize_url); None for links that are
+    # not http(s).  a malformed http(s) or relative href (e.g., http://[bad) is returned as
+    # written, so that it is checked and fails rather than being dropped.  results are
+    # memoized, as the template links repeat on every page
+    href = href.strip()
+    try:
+        url = urljoin(base, href)
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        scheme = href.partition(":")[0].lower() if ":" in href.split("/", 1)[0] else ""
+        return href if scheme in ("", "http", "https") else None
+    if scheme not in ("http", "https"):
+        return None
+    return normalize_url(url)
+
+def host_key(link):
+    # returns the host (netloc) portion of a url; links that can't be parsed share one key
+    try:
+        return urlsplit(link).netloc.lower()
+    except ValueError:
+        return ""
+
+def normalize_url(link):
+    # returns the form of a url used as its cache key: lower-case scheme and host, default
+    # port and fragment dropped, empty path as '/'; anything unparseable is returned as is
+    try:
+        parts = urlsplit(link)
+        port = parts.port
+    except (ValueError, TypeError, AttributeError):
+        return link
+    if not parts.scheme or not parts.hostname:
+        return link
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if port is not None and port != default_ports.get(scheme):
+        netloc += ":" + str(port)
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+def probe(link, timeout=None, verify=True, headers=None):
+    # function sends HEAD for a url, falling back to a streamed GET if HEAD is rejected;
+    # returns the response (exceptions are left to the caller)
+    if timeout is None:
+        timeout = request_timeout
+    response = session_helper.head(link, timeout=timeout, verify=verify, headers=headers,
+                                   allow_redirects=True)
+    if response.status_code in head_rejected:
+        response = session_helper.get(link, timeout=timeout, verify=verify, headers=headers, stream=True)
+        response.close()  # headers are all we need; drop the body unread
+        session_helper.record_transfer(response)
+    return response
+
+def page_response(link, timeout=None, verify=True, headers=None):
+    # function returns the response for a url using probe mode or a plain GET
+    if timeout is None:
+        timeout = request_timeout
+    if probe_mode:
+        return probe(link, timeout, verify, headers)
+    return session_helper.get(link, timeout=timeout, verify=verify, headers=headers)
+
+def probe_status(link, timeout=None, verify=True):
+    return probe(link, timeout, verify).status_code
+
+def page_status(link, timeout=None, verify=True):
+    return page_response(link, timeout, verify).status_code
+
+def fetch_status(link, timeout=None):
+    # function requests a single url and returns its status code (999 if the request fails,
+    # "host down" if the host's circuit is open - not cached or stored, as it is transient);
+    # status_cache is consulted first and updated with the result, as is result_store
+    key = normalize_url(link)
+    status = status_cache.get(key)
+    if status is not None:
+        return status
+    stored = result_store.get(key) if result_store is not None else None
+    if incremental and store_helper.ResultStore.is_current(stored, store_max_age):
+        status_cache.put(key, stored["status"])
+        return stored["status"]
+    etag = last_modified = None
+    start_time = time.time()
+    try:
+        response = page_response(link, timeout, headers=store_helper.ResultStore.conditional_headers(stored))
+        status = response.status_code
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if status == 304:  # unchanged since the stored (passing) check
+            status = stored["status"]
+            etag = etag or stored["etag"]
+            last_modified = last_modified or stored["last_modified"]
+    except ratelimit_helper.HostDown:
+        return ratelimit_helper.down_status
+    except:
+        status = 999
+    if result_store is not None:
+        result_store.record(key, status, etag, last_modified, time.time() - start_time)
+    status_cache.put(key, status)
+    return status
+
+def interleave_by_host(url_list):
+    # returns the indices of url_list reordered round-robin across hosts so that
+    # links to one busy host do not hold up all of the workers
+    by_host = {}
+    for idx, link in enumerate(url_list):
+        by_host.setdefault(host_key(link), []).append(idx)
+    queues = list(by_host.values())
+    order = []
+    while queues:
+        for queue in queues:
+            order.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return order
+
+def status_chk(url_list, max_workers=None, per_host=None, timeout=None, on_result=None):
     # function tests access status for a list of url's, returning a status per url
+    # (in the same order as url_list); requests are issued concurrently, bounded by
+    # a global in-flight cap (max_workers) and a per-host connection limit (per_host).
+    # on_result(url, status, seconds), e.g., sink_helper.recorder(...), is called from the
+    # worker as each distinct url's check completes
+    if max_workers is None:
+        max_workers = max_in_flight
+    if per_host is None:
+        per_host = max_per_host
     status = [200] * len(url_list)
-    for idx, link in enumerate(url_list):
-        try:
-            status[idx] = requests.get(link).status_code
-        except:
-            status[idx] = 999
+    if not url_list:
+        return status
+    # duplicate-equivalent url's are checked once and share the result
+    keys = [normalize_url(link) for link in url_list]
+    first = {}
+    for idx, key in enumerate(keys):
+        first.setdefault(key, idx)
+    unique = sorted(first.values())
+    host_slots = {}
+    for idx in unique:
+        host_slots.setdefault(host_key(url_list[idx]), threading.BoundedSemaphore(per_host))
+
+    def check(idx):
+        link = url_list[idx]
+        with host_slots[host_key(link)]:
+            start_time = time.perf_counter()
+            queued = timing_helper.waited()
+            status[idx] = fetch_status(link, timeout)
+            seconds = time.perf_counter() - start_time - (timing_helper.waited() - queued)  # less rate limit waits
+        if on_result is not None:
+            on_result(link, status[idx], seconds)
+
+    order = [unique[i] for i in interleave_by_host([url_list[idx] for idx in unique])]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as pool:
+        list(pool.map(check, order))
+    for idx, key in enumerate(keys):
+        status[idx] = status[first[key]]
     return status
 
 def build_table(list1, list2):
@@ -36,8 +227,19 @@ def build_table(list1, list2):
         report[idx] = [list1[idx], list2[idx]]
     return report
 
-def write_report(test_name, assert_error, col1, col2):
-    if assert_error:
+def write_report(test_name, assert_error, col1, col2, streamed=False):
+    # prints the test's outcome and its (expected, actual) table; when a result sink is
+    # configured (sink_helper) the rows go to the sink instead - unless they were streamed
+    # there already as they completed - and only the tally is printed
+    if sink_helper.sink.active:
+        sink_helper.sink.claim(test_name)
+        if not streamed:
+            for expected, actual in zip(col1, col2):
+                sink_helper.record(test_name, expected, expected, actual)
+        checked, failed = sink_helper.sink.tally(test_name)
+        print(test_name + ("Test failed for one or more instances" if assert_error else "Test completed successfully") +
+              " ({} checked, {} failed; results in {})".format(checked, failed, ", ".join(sink_helper.sink.paths)))
+    elif assert_error:
         print(test_name + "Test failed for one or more instances")
         report = build_table(col1, col2)
         headers = ["expected", "actual"]
@@ -47,4 +249,7 @@ def write_report(test_name, assert_error, col1, col2):
         report = build_table(col1, col2)
         headers = ["expected", "actual url or status"]
         print(tabulate(report, headers, tablefmt='grid'))
+    stats = status_cache.stats()
+    if stats["hits"] or stats["misses"]:
+        print("URL cache: {hits} hits, {misses} misses, {evictions} evictions, {entries} entries".format(**stats))
     return
\ No newline at end of file
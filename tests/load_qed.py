@@ -0,0 +1,207 @@
+import argparse
+import json
+import random
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from . import auth_helper
+from . import bench_models
+from . import stub_server
+from . import targets_helper
+
+# load generation for the qed servers, built on the TestQEDHost page lists and the
+# mechanicalsoup login/submit flow.  virtual users mix page views with model submissions
+# (default input form) under one of two workload models:
+#   closed - a fixed number of users, each logged in with its own session, repeating
+#            action -> think time; users are started evenly over the ramp period
+#   open   - actions arrive at a target rate (poisson arrivals) regardless of how fast
+#            the server answers; the rate ramps up linearly over the ramp period and
+#            latency is measured from the scheduled arrival, so queueing counts
+# throughput, latency percentiles and error rates are reported per interval and overall
+# run with, e.g.:
+#   python -m tests.load_qed --stub --workload closed --users 10 --duration 30
+#   python -m tests.load_qed --server s1 --workload open --rate 5 --ramp 60 --duration 300
+
+
+class LoadRecorder(object):
+    """
+    thread-safe record of completed actions: (start offset s, action, seconds, ok)
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def offset(self):
+        return time.perf_counter() - self.start_time
+
+    def add(self, started, action, seconds, ok):
+        with self._lock:
+            self.rows.append((started, action, seconds, ok))
+        return
+
+
+def page_view(browsers, url):
+    return browsers.open(url).status_code < 400
+
+
+def model_run(browsers, url):
+    return bench_models.output_ok(browsers.submit(url))
+
+
+def perform(recorder, browsers, action, url, scheduled=None):
+    # runs one action and records it; latency runs from 'scheduled' (open model) if given
+    started = recorder.offset() if scheduled is None else scheduled
+    try:
+        ok = page_view(browsers, url) if action == "view" else model_run(browsers, url)
+    except Exception:
+        ok = False
+    recorder.add(started, action, recorder.offset() - started, ok)
+    return
+
+
+def pick(rng, pages, inputs, submit_ratio):
+    if inputs and rng.random() < submit_ratio:
+        return "submit", rng.choice(inputs)
+    return "view", rng.choice(pages)
+
+
+def run_closed(recorder, make_browsers, pages, inputs, users, duration, ramp, think, submit_ratio):
+    deadline = duration
+
+    def user(number):
+        rng = random.Random(number)
+        browsers = make_browsers()  # each virtual user logs in with its own session
+        time.sleep(ramp * number / float(users))
+        try:
+            while recorder.offset() < deadline:
+                perform(recorder, browsers, *pick(rng, pages, inputs, submit_ratio))
+                if think > 0:
+                    time.sleep(rng.expovariate(1.0 / think))
+        finally:
+            browsers.close()
+
+    threads = [threading.Thread(target=user, args=(number,)) for number in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return
+
+
+def run_open(recorder, make_browsers, pages, inputs, rate, duration, ramp, max_in_flight, submit_ratio):
+    rng = random.Random(0)
+    browsers = make_browsers()  # sessions shared by all arrivals (pooled browsers)
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        arrival = 0.0
+        while True:
+            current_rate = rate * min(1.0, arrival / ramp) if ramp > 0 else rate
+            arrival += rng.expovariate(max(current_rate, rate * 0.1))  # ramp starts at 10% of the rate
+            if arrival >= duration:
+                break
+            wait = arrival - recorder.offset()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(perform, recorder, browsers, *pick(rng, pages, inputs, submit_ratio), scheduled=arrival)
+        pool.shutdown(wait=True)
+    finally:
+        browsers.close()
+    return
+
+
+def timeline(rows, interval):
+    # per interval of start time: actions completed, throughput, latency percentiles, error rate
+    table = []
+    if not rows:
+        return table
+    starts = np.array([row[0] for row in rows])
+    seconds = np.array([row[2] for row in rows])
+    ok = np.array([row[3] for row in rows])
+    for bucket in range(int(starts.max() // interval) + 1):
+        mask = (starts >= bucket * interval) & (starts < (bucket + 1) * interval)
+        if not mask.any():
+            continue
+        p50, p95, p99 = np.percentile(seconds[mask], [50, 95, 99])
+        table.append(["{:g}-{:g}".format(bucket * interval, (bucket + 1) * interval), int(mask.sum()),
+                      round(mask.sum() / float(interval), 2), round(p50, 3), round(p95, 3), round(p99, 3),
+                      round(1 - ok[mask].mean(), 3)])
+    return table
+
+
+def totals(rows, wall):
+    table = []
+    for action in ("view", "submit", "all"):
+        selected = [row for row in rows if action == "all" or row[1] == action]
+        if not selected:
+            continue
+        seconds = np.array([row[2] for row in selected])
+        ok = np.array([row[3] for row in selected])
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        table.append([action, len(selected), round(len(selected) / wall, 2), round(p50, 3), round(p95, 3),
+                      round(p99, 3), round(1 - ok.mean(), 3)])
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="load generation against a qed server")
+    parser.add_argument("--server", default="s1", help="pub, s1, s5 or a server url")
+    parser.add_argument("--stub", action="store_true", help="run against a local stand-in server")
+    parser.add_argument("--workload", choices=["closed", "open"], default="closed")
+    parser.add_argument("--users", type=int, default=5, help="virtual users (closed workload)")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time, s (closed workload)")
+    parser.add_argument("--rate", type=float, default=2.0, help="target actions per second (open workload)")
+    parser.add_argument("--max-in-flight", type=int, default=50, help="cap on concurrent actions (open workload)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds to reach full users/rate")
+    parser.add_argument("--submit-ratio", type=float, default=0.1, help="share of actions that run a model")
+    parser.add_argument("--interval", type=float, default=5.0, help="reporting interval, s")
+    parser.add_argument("--json", help="write the timeline and totals to this json file")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.stub:
+        server, base = stub_server.start()
+        root = base + "/secure/"
+        pages = [root + "pram/" + m + p for m in targets_helper.models for p in targets_helper.pages]
+    else:
+        root = targets_helper.server_url(args.server)
+        pages = [target.url for target in targets_helper.targets("host", [root])]
+        if not pages:
+            pages = [root + "pram/" + m + p for m in targets_helper.models for p in targets_helper.pages]
+    inputs = [root + "pram/" + m + "input" for m in targets_helper.models_nonbeta]
+
+    user, password = bench_models.credentials(args.stub)  # secrets are only read for a real server
+
+    def make_browsers():
+        return auth_helper.AuthenticatedBrowsers(user, password, limited=False)
+
+    recorder = LoadRecorder()
+    try:
+        if args.workload == "closed":
+            run_closed(recorder, make_browsers, pages, inputs, args.users, args.duration, args.ramp,
+                       args.think, args.submit_ratio)
+        else:
+            run_open(recorder, make_browsers, pages, inputs, args.rate, args.duration, args.ramp,
+                     args.max_in_flight, args.submit_ratio)
+    finally:
+        if server is not None:
+            server.shutdown()
+    wall = recorder.offset()
+    headers = ["interval s", "actions", "per s", "p50 s", "p95 s", "p99 s", "error rate"]
+    over_time = timeline(recorder.rows, args.interval)
+    print(tabulate(over_time, headers, tablefmt='grid'))
+    overall = totals(recorder.rows, wall)
+    print(tabulate(overall, ["action"] + headers[1:], tablefmt='grid'))
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"settings": vars(args), "timeline": [dict(zip(headers, row)) for row in over_time],
+                       "totals": [dict(zip(["action"] + headers[1:], row)) for row in overall]}, out, indent=1)
+    return overall
+
+
+if __name__ == '__main__':
+    main()
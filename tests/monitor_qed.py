@@ -0,0 +1,163 @@
+import argparse
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from . import alert_helper
+from . import results_helper
+from . import shard_qed
+from . import sink_helper
+from . import store_helper
+from . import test_host_qed
+
+# continuous monitor: a long-running process that sweeps the TestQEDHost servers every
+# 'interval' seconds instead of a fresh pytest run per check, so the keep-alive sessions,
+# logins and expanded target lists stay warm from one sweep to the next.  each server's
+# pages are probed once per interval at random times spread across it (not in a burst);
+# at the end of a sweep the results go through TestQEDHost.check_response, and the server
+# is up if they pass.  slack alerts (same hooks and message format as the tests) are sent
+# only when a server changes state (up -> down, down -> up); every probe is kept in a
+# rolling sqlite store for store_days, along with each server's last state, so a restart
+# does not repeat an alert.  run with, e.g.:
+#   python -m tests.monitor_qed --interval 300 --store qed_monitor.sqlite
+#   python -m tests.monitor_qed --once --interval 30      (one sweep of each server)
+# QED_SERVERS / QED_MODELS / QED_PAGES narrow the sweep as for pytest
+
+interval = 300  # seconds per sweep of a server
+store_path = "qed_monitor.sqlite"
+store_days = 7  # days of probes kept in the store
+
+
+class ServerMonitor(object):
+    """
+    periodic sweep of one server's pages; state is "up", "down" or None (not known yet)
+    """
+
+    def __init__(self, server, hook_url=None, store=None, period=interval, stop=None, page_list=None):
+        self.server = server
+        self.hook_url = hook_url
+        self.store = store
+        self.period = period
+        self.stop = stop if stop is not None else threading.Event()
+        targets = test_host_qed.sweep_targets(server)
+        self.page_list = page_list if page_list is not None else [target.url for target in targets]
+        self.login = any(target.login for target in targets)
+        self.verify = all(target.verify for target in targets)
+        self.host = test_host_qed.TestQEDHost()
+        self.pool = ThreadPoolExecutor(max_workers=test_host_qed.server_workers.get(server, 1))
+        self.state, self.since = store.state(server) if store is not None else (None, None)
+        self.sweeps = 0
+        self.alerts = 0
+        self.failures = ()  # failure messages from the last sweep
+
+    def probe(self, url):
+        # checks one page on the monitor's pool thread (no pool of its own, no per-page print)
+        status, seconds = test_host_qed.check_page(url, self.login, self.verify)
+        if sink_helper.sink.active:
+            test_host_qed.record_page(url, status, seconds)
+        return results_helper.CheckResults.from_responses([url], [status], [seconds])
+
+    def sweep(self):
+        # probes every page once, each at a random time in its slot of the period; returns
+        # CheckResults in page order (only the pages probed, if stopped part way)
+        order = random.sample(self.page_list, len(self.page_list))
+        start_time = time.monotonic()
+        futures = []
+        for idx, url in enumerate(order):
+            due = start_time + self.period * (idx + random.random()) / len(order)
+            if self.stop.wait(max(0.0, due - time.monotonic())):
+                break
+            futures.append(self.pool.submit(self.probe, url))
+        parts = [future.result() for future in futures]
+        return results_helper.CheckResults.combine(parts, self.page_list)
+
+    def check(self, results):
+        # judges a sweep with check_response, stores it and alerts if the state changed
+        try:
+            self.host.check_response(results.urls, 200, None, self.server, self.login, self.verify,
+                                     response=results)
+            state, self.failures = "up", ()
+        except AssertionError as e:
+            state, self.failures = "down", tuple(arg for arg in e.args if isinstance(arg, str))
+        self.sweeps += 1
+        if self.store is not None:
+            data = results.to_dict()
+            self.store.record(self.server, zip(data["urls"], data["status"], data["latency"]))
+        if state != self.state:
+            if state == "down":
+                self.alert(self.host.are_all_down("\n".join(self.failures), results.urls, self.server))
+            elif self.state is not None:  # nothing to report when the first sweep finds it up
+                self.alert(self.server + " is back up")
+            self.state, self.since = state, time.time()
+            if self.store is not None:
+                self.store.save_state(self.server, state, self.since)
+        print("{} {}: {} ({} pages, {} failed)".format(time.strftime("%Y-%m-%d %H:%M:%S"), self.server, state,
+                                                      len(results), len(self.failures)))
+        return state
+
+    def alert(self, message):
+        self.alerts += 1
+        print(message)
+        if self.hook_url is not None:  # queued; a state change is never dropped as a repeat
+            alert_helper.alerts.put(self.hook_url, message, self.server, dedupe=False)
+        return
+
+    def run(self, cycles=None):
+        # sweeps until stop is set (or 'cycles' sweeps are done)
+        while not self.stop.is_set() and (cycles is None or self.sweeps < cycles):
+            start_time = time.monotonic()
+            results = self.sweep()
+            if self.stop.is_set() and len(results) < len(self.page_list):
+                break  # a partial sweep is not judged
+            self.check(results)
+            if cycles is None or self.sweeps < cycles:
+                self.stop.wait(max(0.0, start_time + self.period - time.monotonic()))
+        self.pool.shutdown()
+        return
+
+
+def report(monitors):
+    rows = [[monitor.server, monitor.state or "", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(monitor.since))
+             if monitor.since else "", monitor.sweeps, len(monitor.failures), monitor.alerts]
+            for monitor in monitors]
+    print(tabulate(rows, ["server", "state", "since", "sweeps", "failures (last sweep)", "alerts"],
+                   tablefmt='grid'))
+    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="continuous qed monitor")
+    parser.add_argument("--interval", type=float, default=interval, help="seconds per sweep of each server")
+    parser.add_argument("--store", default=store_path, help="sqlite file for the probe log and server states")
+    parser.add_argument("--days", type=float, default=store_days, help="days of probes kept in the store")
+    parser.add_argument("--once", action="store_true", help="sweep each server once, then exit")
+    args = parser.parse_args(argv)
+
+    store = store_helper.ProbeStore(args.store, args.days * 24 * 3600)
+    stop = threading.Event()
+    hooks = shard_qed.server_hooks()
+    monitors = [ServerMonitor(server, hooks.get(server), store, args.interval, stop)
+                for server in test_host_qed.selected_servers()]
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    threads = [threading.Thread(target=monitor.run, args=(1 if args.once else None,), daemon=True)
+               for monitor in monitors]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(1.0)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    report(monitors)
+    store.close()
+    return 1 if any(monitor.state == "down" for monitor in monitors) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from . import session_helper
+
+# single-pass link extraction for qed pages; the page is streamed through an incremental
+# html parser that collects the anchors inside each named region (div) at once, and the
+# rest of the body is not read once every region has been seen
+
+# region name -> (attribute, value) identifying the region's div on the ubertool pages
+page_regions = {"banner": ("id", "banner"),
+                "header_menu_r": ("id", "header_menu_r"),
+                "left": ("class", "left"),
+                "right": ("class", "right"),
+                "articles": ("class", "articles")}
+
+chunk_size = 16384  # bytes read from the response per parser feed
+
+# document cache: region links per (url, regions) for the whole test session, so tests
+# reading different regions of the same page share one fetch and parse and all see the
+# same copy of the page
+_documents = {}
+_document_locks = {}
+_lock = threading.Lock()
+
+
+class PageLinks(dict):
+    """
+    region name -> [anchor attribute dicts] for a page, with the page's final url (after
+    redirects) and the base url its relative links resolve against (its <base href>, or url)
+    """
+
+    def __init__(self, links, url=None, base=None):
+        dict.__init__(self, links)
+        self.url = url
+        self.base = base or url
+
+
+class RegionLinkParser(HTMLParser):
+    """
+    incremental parser that records the attributes of every anchor within the first div
+    matching each region; div nesting is tracked so a region ends at its closing tag
+    """
+
+    def __init__(self, regions=None):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.regions = page_regions if regions is None else regions
+        self.links = dict((name, []) for name in self.regions)
+        self.open_regions = {}  # region name -> div depth at which it opened
+        self.done = set()
+        self.div_depth = 0
+        self.base = None  # <base href>, if the page has one
+
+    def matches(self, attrs, attr, value):
+        if attr == "class":
+            return value in (attrs.get("class") or "").split()
+        return attrs.get(attr) == value
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self.div_depth += 1
+            attrs = dict(attrs)
+            for name, (attr, value) in self.regions.items():
+                if name not in self.done and name not in self.open_regions \
+                        and self.matches(attrs, attr, value):
+                    self.open_regions[name] = self.div_depth
+        elif tag == "a" and self.open_regions:
+            attrs = dict(attrs)
+            for name in self.open_regions:
+                self.links[name].append(attrs)
+        elif tag == "base" and self.base is None:
+            self.base = dict(attrs).get("href")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag != "div":  # a self-closed div holds no links
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self.div_depth > 0:
+            for name, depth in list(self.open_regions.items()):
+                if depth == self.div_depth:
+                    del self.open_regions[name]
+                    self.done.add(name)
+            self.div_depth -= 1
+
+    @property
+    def complete(self):
+        return len(self.done) == len(self.regions)
+
+
+class PageLinkParser(HTMLParser):
+    """
+    parser that records the href of every anchor in a page, and the page's <base href>
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.base = None
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+        elif tag == "base" and self.base is None:
+            self.base = dict(attrs).get("href")
+
+    handle_startendtag = handle_starttag
+
+
+def page_links(response):
+    # returns (base href or None, [anchor hrefs]) for a streamed html response, which is
+    # read in chunks and closed
+    parser = PageLinkParser()
+    try:
+        response.encoding = response.encoding or "utf-8"
+        for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
+            parser.feed(chunk)
+    finally:
+        response.close()
+        session_helper.record_transfer(response)
+    return parser.base, parser.hrefs
+
+
+def parse_links(html, regions=None, size=None):
+    # returns {region name: [anchor attribute dicts]} for an html string, feeding the
+    # parser in chunks and stopping as soon as every region has been seen
+    if size is None:
+        size = chunk_size
+    parser = RegionLinkParser(regions)
+    for start in range(0, len(html), size):
+        parser.feed(html[start:start + size])
+        if parser.complete:
+            break
+    return parser.links
+
+
+def extract_links(url, regions=None, verify=True, timeout=None):
+    # streams url through the parser and returns PageLinks, {region name: [anchor attribute
+    # dicts]} with the page's url and base; the response is closed (unread remainder
+    # dropped) once every region has been seen.  the attribute dicts support .get('href'),
+    # and .base is the root_url, expected by build_http_links.  an error status (400 or
+    # more) raises requests.HTTPError rather than returning the error page's (empty) regions
+    parser = RegionLinkParser(regions)
+    response = session_helper.get(url, stream=True, verify=verify, timeout=timeout)
+    if response.status_code >= 400:
+        response.close()
+        session_helper.record_transfer(response)
+        response.raise_for_status()
+    try:
+        response.encoding = response.encoding or "utf-8"
+        for chunk in response.iter_content(chunk_size=chunk_size, decode_unicode=True):
+            parser.feed(chunk)
+            if parser.complete:
+                break
+    finally:
+        response.close()
+        session_helper.record_transfer(response)
+    base = urljoin(response.url, parser.base) if parser.base else response.url
+    return PageLinks(parser.links, response.url, base)
+
+
+def cached_links(url, regions=None, verify=True, timeout=None):
+    # returns extract_links(url, regions), fetching and parsing the page only on first use;
+    # concurrent callers for the same page wait for the one fetch.  failed fetches (including
+    # error statuses, which raise) are not cached, so the next caller tries again
+    if regions is None:
+        regions = page_regions
+    key = (url, tuple(sorted(regions.items())))
+    with _lock:
+        if key in _documents:
+            return _documents[key]
+        url_lock = _document_locks.setdefault(key, threading.Lock())
+    with url_lock:
+        with _lock:
+            if key in _documents:
+                return _documents[key]
+        links = extract_links(url, regions, verify, timeout)
+        with _lock:
+            _documents[key] = links
+    return links
+
+
+def clear_documents():
+    with _lock:
+        _documents.clear()
+        _document_locks.clear()
+    return
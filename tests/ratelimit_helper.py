@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from tabulate import tabulate
+from . import timing_helper
+
+# per-host rate limiting for every request made through the shared sessions (the adapter
+# built by session_helper.build_session): each host gets a token bucket (host_rate requests
+# per second, bursts of up to host_burst).  a 429 or 503 halves the host's rate (it creeps
+# back up with each good response) and pauses the whole host for its Retry-After (or
+# throttle_pause, doubled per retry, without one); a GET/HEAD is then retried, up to
+# throttle_retries times, once the pause is over, and only the last status is returned.
+# after failure_threshold requests in a row fail with a connection error or timeout the
+# host's circuit opens: its requests fail at once with HostDown (reported as "host down")
+# for open_seconds, then a single trial request decides whether it closes again.  the
+# count is of requests, not connection attempts: each failed request has already been
+# retried by the session (1 + session_helper.max_retries attempts), and requests already
+# in flight when the circuit opens (up to the per-host concurrency) still run their course
+
+host_rate = float(os.environ.get("QED_HOST_RATE", 10))  # requests per second per host
+host_burst = 10
+min_rate = 0.5
+backoff_statuses = (429, 503)
+throttle_retries = 2  # retries of a GET/HEAD answered with a backoff status
+throttle_pause = 1.0  # s host pause after a 429/503 without Retry-After (doubled per retry)
+retry_methods = ("GET", "HEAD", "OPTIONS")
+backoff_multiplier = 0.5  # rate after a 429/503 = rate * backoff_multiplier
+recovery_factor = 1.05  # rate after a good response = rate * recovery_factor (up to host_rate)
+max_retry_after = 60  # s, longest Retry-After pause honored
+failure_threshold = 3  # consecutive failed requests that open the circuit
+open_seconds = 60  # s the circuit stays open before a trial request
+down_status = "host down"  # reported for requests refused while a host's circuit is open
+
+
+class HostDown(requests.exceptions.ConnectionError):
+    """
+    raised instead of sending a request to a host whose circuit is open
+    """
+
+
+def retry_after_seconds(value):
+    # seconds from a Retry-After header (delay in seconds or an http date); None if unusable
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), max_retry_after)
+
+
+class HostLimiter(object):
+    """
+    token bucket, adaptive rate and circuit breaker for one host
+    """
+
+    def __init__(self, host, rate=None, burst=None):
+        self.host = host
+        self.max_rate = rate or host_rate
+        self.rate = self.max_rate
+        self.burst = burst or host_burst
+        self.tokens = float(self.burst)
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0
+        self.failures = 0  # consecutive connection failures
+        self.open_until = None  # set while the circuit is open
+        self.trial = False  # a trial request is in flight (half open)
+        self.stats = {"requests": 0, "waited": 0.0, "throttled": 0, "retried": 0, "failures": 0, "opened": 0,
+                      "refused": 0}
+        self._lock = threading.Lock()
+
+    def state(self):
+        if self.open_until is None:
+            return "closed"
+        return "half open" if self.trial or time.monotonic() >= self.open_until else "open"
+
+    def acquire(self):
+        # waits for a token (and any Retry-After pause); raises HostDown while the circuit is
+        # open.  returns True when the request is the half open circuit's trial request
+        trial = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.open_until is not None:
+                    if now < self.open_until or self.trial:
+                        self.stats["refused"] += 1
+                        raise HostDown("{} is down (circuit open after {} connection failures)".format(
+                                       self.host, self.failures))
+                    self.trial = trial = True  # let one request through to see if the host is back
+                self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+                self.refilled = now
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0)
+                if wait <= 0:
+                    self.tokens -= 1
+                    self.stats["requests"] += 1
+                    return trial
+                self.stats["waited"] += wait
+            time.sleep(wait)
+            timing_helper.add_wait(wait)  # queued, not part of the request's latency
+
+    def succeeded(self, response, pause=None):
+        # a response arrived: closes the circuit; slows down on 429/503, pausing the host for
+        # its Retry-After (or 'pause' seconds without one)
+        with self._lock:
+            self.failures = 0
+            self.open_until = None
+            self.trial = False
+            if response.status_code in backoff_statuses:
+                self.stats["throttled"] += 1
+                self.rate = max(min_rate, self.rate * backoff_multiplier)
+                pause = retry_after_seconds(response.headers.get("Retry-After")) or pause
+                if pause:
+                    self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            else:
+                self.rate = min(self.max_rate, self.rate * recovery_factor)
+        return
+
+    def failed(self):
+        # a connection failure or timeout: opens the circuit after failure_threshold in a row
+        # (or when a trial request fails)
+        with self._lock:
+            self.failures += 1
+            self.stats["failures"] += 1
+            if self.trial or self.failures >= failure_threshold:
+                if self.open_until is None:  # closed -> open (not a failed trial, or a request in flight)
+                    self.stats["opened"] += 1
+                self.open_until = time.monotonic() + open_seconds
+                self.trial = False
+        return
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def limiter_for(url):
+    # returns the limiter for url's host (scheme + host + port), created on first use
+    parts = urlsplit(url)
+    key = parts.scheme.lower() + "://" + parts.netloc.lower()
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = HostLimiter(key)
+            _limiters[key] = limiter
+    return limiter
+
+
+def clear():
+    with _lock:
+        _limiters.clear()
+    return
+
+
+class LimitedHTTPAdapter(timing_helper.TimedHTTPAdapter):
+    """
+    timed adapter that sends each request through its host's limiter
+    """
+
+    def send(self, request, **kwargs):
+        limiter = limiter_for(request.url)
+        for attempt in range(throttle_retries + 1):
+            trial = limiter.acquire()  # waits out any pause set by a 429/503
+            try:
+                response = super(LimitedHTTPAdapter, self).send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                limiter.failed()
+                raise
+            except BaseException:  # e.g., an invalid header: a trial must still resolve the circuit
+                if trial:
+                    limiter.failed()
+                raise
+            limiter.succeeded(response, throttle_pause * 2 ** attempt)
+            if response.status_code not in backoff_statuses or request.method not in retry_methods \
+                    or attempt == throttle_retries:
+                return response
+            with limiter._lock:
+                limiter.stats["retried"] += 1
+            response.close()
+        return response
+
+
+def stats_rows():
+    # one row per host that was slowed down, throttled, failed or refused requests
+    with _lock:
+        limiters = sorted(_limiters.items())
+    rows = []
+    for key, limiter in limiters:
+        stats = dict(limiter.stats)
+        if stats["waited"] > 0 or stats["throttled"] or stats["failures"] or stats["refused"]:
+            rows.append([key, stats["requests"], round(stats["waited"], 2), stats["throttled"], stats["retried"],
+                         round(limiter.rate, 2), stats["failures"], stats["opened"], stats["refused"],
+                         limiter.state()])
+    return rows
+
+
+def report():
+    # prints the hosts whose requests were rate limited, throttled or refused
+    rows = stats_rows()
+    if rows:
+        headers = ["host", "requests", "waited s", "throttled", "retried", "rate now", "connection failures",
+                   "circuit opened", "refused (host down)", "circuit"]
+        print(tabulate(rows, headers, tablefmt='grid'))
+    return
@@ -0,0 +1,182 @@
+import numpy as np
+from urllib.parse import urlsplit
+
+# compact, typed record of a page sweep: one row per url in a structured numpy array
+# (url id, status code, error class, latency) so failures can be masked, grouped by
+# server/model/page and counted without python-level loops over mixed int/str lists
+
+error_names = ["", "Error", "fail"]  # error class 0 = a response with a status code
+result_dtype = np.dtype([("url_id", np.int32), ("status", np.int16),
+                         ("error", np.int8), ("latency", np.float32)])
+
+
+def url_parts(url):
+    # splits a qed url into (server, model, page), e.g.
+    # https://qed.epa.gov/pram/sip/input -> ("https://qed.epa.gov/", "sip", "input")
+    # https://qed.epa.gov/hms/hydrology/ -> ("https://qed.epa.gov/", "hms", "hydrology")
+    parts = urlsplit(url)
+    server = parts.scheme + "://" + parts.netloc + "/"
+    path = [p for p in parts.path.split("/") if p]
+    if path and path[0] in ("pram", "ubertool") and len(path) > 1:
+        path = path[1:]
+    model = path[0] if path else ""
+    page = "/".join(path[1:])
+    return server, model, page
+
+
+class CheckResults(object):
+    """
+    results of checking a list of url's; records is a structured array (result_dtype)
+    whose url_id indexes into urls
+    """
+
+    def __init__(self, urls, records):
+        self.urls = list(urls)
+        self.records = records
+        self._labels = None
+
+    @classmethod
+    def from_responses(cls, urls, responses, latencies=None):
+        # builds results from a status list as returned by the checks: an int status code
+        # per url, or an error string (e.g., "Error") where no response was received
+        n = len(urls)
+        records = np.zeros(n, dtype=result_dtype)
+        records["url_id"] = np.arange(n)
+        records["latency"] = np.nan if latencies is None else latencies
+        for idx, resp in enumerate(responses):
+            if isinstance(resp, (int, np.integer)):
+                records["status"][idx] = resp
+            else:
+                name = str(resp)
+                if name not in error_names:
+                    error_names.append(name)
+                records["error"][idx] = error_names.index(name)
+        return cls(urls, records)
+
+    @classmethod
+    def from_dict(cls, data):
+        # inverse of to_dict
+        latencies = [np.nan if value is None else value for value in data["latency"]]
+        return cls.from_responses(data["urls"], data["status"], latencies)
+
+    @classmethod
+    def combine(cls, parts, order=None):
+        # one result set from several (e.g., the shards of a sweep); rows follow order (a
+        # list of urls) where given, otherwise the order of parts
+        urls, responses, latencies = [], [], []
+        for part in parts:
+            for idx in range(len(part)):
+                urls.append(part.urls[part.records["url_id"][idx]])
+                responses.append(part.display_status(idx))
+                latencies.append(part.records["latency"][idx])
+        if order is not None:
+            position = dict((url, idx) for idx, url in enumerate(order))
+            rows = sorted(range(len(urls)), key=lambda row: position.get(urls[row], len(position)))
+            urls, responses, latencies = [urls[row] for row in rows], [responses[row] for row in rows], \
+                                         [latencies[row] for row in rows]
+        return cls.from_responses(urls, responses, latencies)
+
+    def to_dict(self):
+        # json-ready form: urls with their status (code or error class) and latency
+        latencies = self.records["latency"]
+        return {"urls": [self.urls[uid] for uid in self.records["url_id"]],
+                "status": [self.display_status(idx) for idx in range(len(self.records))],
+                "latency": [None if np.isnan(value) else round(float(value), 4) for value in latencies]}
+
+    def __len__(self):
+        return len(self.records)
+
+    def budgets(self, page_budgets, default=None):
+        # latency budget (seconds) per row: page_budgets maps a full url or a page name
+        # (e.g., "input"; "" for a model's main page) to seconds; nan where there is none
+        pages = self.labels()["page"]
+        values = [page_budgets.get(self.urls[uid], page_budgets.get(pages[uid], default))
+                  for uid in self.records["url_id"]]
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float32)
+
+    def over_budget(self, code, page_budgets, default=None):
+        # boolean mask of rows that returned the expected code but took longer than their budget
+        with np.errstate(invalid='ignore'):
+            slow = self.records["latency"] > self.budgets(page_budgets, default)
+        return slow & ~self.status_failed(code)
+
+    def status_failed(self, code):
+        # boolean mask of rows that did not return the expected status code
+        return (self.records["status"] != code) | (self.records["error"] != 0)
+
+    def failed(self, code, page_budgets=None, default=None):
+        # boolean mask of failed rows: wrong status code or, when budgets are given, too slow
+        failed = self.status_failed(code)
+        if page_budgets is not None or default is not None:
+            failed = failed | self.over_budget(code, page_budgets or {}, default)
+        return failed
+
+    def display_status(self, idx):
+        # the status as shown in reports: the code, or the error class name
+        row = self.records[idx]
+        return error_names[row["error"]] if row["error"] else int(row["status"])
+
+    def failure_messages(self, code, page_budgets=None, default=None):
+        # one message per failed url, in url order; pages over budget are reported as too slow
+        slow = np.zeros(len(self.records), dtype=bool)
+        budget = None
+        if page_budgets is not None or default is not None:
+            slow = self.over_budget(code, page_budgets or {}, default)
+            budget = self.budgets(page_budgets or {}, default)
+        messages = []
+        for idx in np.flatnonzero(self.failed(code, page_budgets, default)):
+            url = self.urls[self.records["url_id"][idx]]
+            if slow[idx]:
+                messages.append("Http response too slow for: {}. Budget *{:g}s* but took *{:.2f}s*.".format(
+                                url, budget[idx], self.records["latency"][idx]))
+            else:
+                messages.append("Http response failed for: {}. Expecting *{}* but found *{}*.".format(
+                                url, code, self.display_status(idx)))
+        return tuple(messages)
+
+    def labels(self):
+        # arrays of server, model and page labels per row (computed once)
+        if self._labels is None:
+            parts = [url_parts(url) for url in self.urls]
+            self._labels = {"server": np.array([p[0] for p in parts]),
+                            "model": np.array([p[1] for p in parts]),
+                            "page": np.array([p[2] for p in parts])}
+        return self._labels
+
+    def group_counts(self, by, mask=None):
+        # counts rows per server, model or page (by), optionally only rows where mask is true
+        labels = self.labels()[by][self.records["url_id"]]
+        if mask is not None:
+            labels = labels[mask]
+        keys, counts = np.unique(labels, return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    def group_percentile(self, code, q=95, by=("server", "model")):
+        # q-th percentile latency of the rows that passed (status code), per group of labels
+        # (by default "server model"); groups with no timed rows are left out
+        labels = self.labels()
+        keys = np.array([" ".join(labels[name][uid] for name in by) for uid in self.records["url_id"]])
+        latency = self.records["latency"].astype(np.float64)
+        usable = ~self.status_failed(code) & ~np.isnan(latency)
+        percentiles = {}
+        for key in np.unique(keys[usable]):
+            percentiles[str(key)] = float(np.percentile(latency[usable & (keys == key)], q))
+        return percentiles
+
+    def summary(self, code, page_budgets=None, default=None):
+        # totals for the sweep: checked, passed, failed, and failures per status/error class;
+        # with budgets (as for failed), pages with the right status but over budget fail as
+        # "too slow"
+        failed = self.failed(code, page_budgets, default)
+        status_failed = self.status_failed(code)
+        failed_rows = self.records[status_failed]
+        by_status = {}
+        if (failed & ~status_failed).any():
+            by_status["too slow"] = int((failed & ~status_failed).sum())
+        errors = failed_rows["error"] != 0
+        for error, count in zip(*np.unique(failed_rows["error"][errors], return_counts=True)):
+            by_status[error_names[error]] = int(count)
+        for status, count in zip(*np.unique(failed_rows["status"][~errors], return_counts=True)):
+            by_status[int(status)] = int(count)
+        return {"checked": len(self.records), "passed": int((~failed).sum()),
+                "failed": int(failed.sum()), "failures by status": by_status}
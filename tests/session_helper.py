@@ -0,0 +1,177 @@
+import threading
+import requests
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from tabulate import tabulate
+from . import ratelimit_helper
+from . import timing_helper
+
+# shared http session layer for the smoke test modules; one pooled, keep-alive
+# requests.Session is kept per server (scheme + host) so that the hundreds of page
+# checks made against a server reuse a handful of tcp/tls connections instead of
+# opening a new one per url; requests are rate limited per host (see ratelimit_helper)
+
+pool_size = 16  # connections kept alive per server (should be >= the concurrency used)
+max_retries = 2  # retries for connection errors and the statuses below
+backoff_factor = 0.5  # sleep between retries = backoff_factor * 2 ** (retry number - 1)
+retry_statuses = (502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+_transfer = {"responses": 0, "header bytes": 0, "body bytes": 0}
+
+
+def server_key(url):
+    # returns scheme://host[:port] for a url, used to pick the session for a server
+    parts = urlsplit(url)
+    return parts.scheme.lower() + "://" + parts.netloc.lower()
+
+
+def build_session(size=None, retries=None, backoff=None, limited=True):
+    # builds a requests.Session with a pooled adapter and retry/backoff policy; requests
+    # are rate limited per host (ratelimit_helper) unless limited is False, as for the load
+    # and benchmark runs, which must measure the server rather than the limiter
+    if size is None:
+        size = pool_size
+    if retries is None:
+        retries = max_retries
+    if backoff is None:
+        backoff = backoff_factor
+    statuses = retry_statuses
+    if limited:  # 429/503 are retried by the limiter (after pausing the host), not by urllib3
+        statuses = tuple(code for code in retry_statuses if code not in ratelimit_helper.backoff_statuses)
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=backoff, status_forcelist=statuses, respect_retry_after_header=not limited,
+                  raise_on_status=False)  # return the last response rather than raising
+    adapter_class = ratelimit_helper.LimitedHTTPAdapter if limited else timing_helper.TimedHTTPAdapter
+    adapter = adapter_class(pool_connections=4, pool_maxsize=size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def session_for(url):
+    # returns the shared session for the server hosting url (created on first use)
+    key = server_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = build_session()
+            _sessions[key] = session
+    return session
+
+
+def record_transfer(response, start_time=None):
+    # adds the bytes received for a response (and any redirects before it) to the run
+    # totals; body bytes are those read off the wire, so a HEAD or a streamed GET that
+    # was closed after the headers counts only its headers.  when the request was timed
+    # (start_time, from a timing_helper.start() made just before sending it, or as set by
+    # request()) its latency is recorded as well
+    header_bytes = 0
+    body_bytes = 0
+    ttfb = 0.0
+    responses = list(response.history) + [response]
+    for resp in responses:
+        header_bytes += len(str(resp.status_code)) + len(resp.reason or "") + 15  # status line
+        header_bytes += sum(len(k) + len(v) + 4 for k, v in resp.headers.items()) + 2
+        try:
+            body_bytes += resp.raw.tell()
+        except AttributeError:
+            body_bytes += len(resp.content or b"")
+        ttfb += resp.elapsed.total_seconds()
+    with _lock:
+        _transfer["responses"] += len(responses)
+        _transfer["header bytes"] += header_bytes
+        _transfer["body bytes"] += body_bytes
+    if start_time is None:
+        start_time = getattr(response, "timing_start", None)
+    else:  # a timing_helper.start() just before the request: leave out time spent queued
+        start_time += timing_helper.queued()
+    if start_time is not None:
+        request_phases = getattr(response, "timing_phases", None) or timing_helper.phases()
+        timing_helper.record(response.url, start_time, request_phases, ttfb, header_bytes + body_bytes)
+    return
+
+
+def request(method, url, **kwargs):
+    # sends a request through the shared session for url's server; transfer and latency
+    # are recorded here unless the caller streams the body (it should then call
+    # record_transfer when done)
+    start_time = timing_helper.start()
+    response = session_for(url).request(method, url, **kwargs)
+    response.timing_start = start_time + timing_helper.queued()  # latency starts once a token is granted
+    response.timing_phases = timing_helper.phases()
+    if not kwargs.get('stream'):
+        record_transfer(response)
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def close_all():
+    # closes every shared session (and its pooled connections)
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+    return
+
+
+def transfer_stats():
+    # returns a copy of the bytes-received totals for this run
+    with _lock:
+        return dict(_transfer)
+
+
+def connection_stats():
+    # returns one row per server: [server, requests sent, connections opened, connections reused]
+    with _lock:
+        items = sorted(_sessions.items())
+    return [[key] + session_connections(session) for key, session in items]
+
+
+def session_connections(session):
+    # returns [requests sent, connections opened, connections reused] for one session
+    n_requests = 0
+    n_connections = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is not None:
+                n_requests += pool.num_requests
+                n_connections += pool.num_connections
+    return [n_requests, n_connections, max(n_requests - n_connections, 0)]
+
+
+def report_connections(rows=None):
+    # prints connection reuse per server (or the given connection_stats style rows);
+    # reused connections are tcp/tls handshakes saved
+    if rows is None:
+        rows = connection_stats()
+    if rows:
+        headers = ["server", "requests", "connections opened", "connections reused"]
+        print(tabulate(rows, headers, tablefmt='grid'))
+    return
+
+
+def report_transfer():
+    # prints the bytes received during this run
+    stats = transfer_stats()
+    if stats["responses"]:
+        rows = [[stats["responses"], stats["header bytes"], stats["body bytes"],
+                 stats["header bytes"] + stats["body bytes"]]]
+        headers = ["responses", "header bytes", "body bytes", "total bytes"]
+        print(tabulate(rows, headers, tablefmt='grid'))
+    return
@@ -0,0 +1,158 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from tabulate import tabulate
+from . import ratelimit_helper
+from . import results_helper
+from . import targets_helper
+from . import test_host_qed
+
+# sharded page sweep: the TestQEDHost targets are split into N shards (targets_helper.shard_of,
+# fixed by url) and each shard is swept by its own process, all servers of a shard at once
+# as in TestQEDHost.  shard results are merged per server into one result set, which goes
+# through TestQEDHost.check_response once - one report, one alert per failing server.
+# locally, worker processes take shard numbers from a job queue (a stand-in for a queue
+# shared by several nodes); across nodes, each node sweeps one shard into a file and one
+# machine merges the files.  run with, e.g.:
+#   python -m tests.shard_qed --shards 4                      (4 local processes)
+#   python -m tests.shard_qed --shards 8 --processes 4        (8 shards, 4 at a time)
+#   python -m tests.shard_qed --shard 2/4 --out shard2.json   (one shard, e.g. on a node)
+#   python -m tests.shard_qed --merge shard*.json             (report and alert)
+# QED_SERVERS / QED_MODELS / QED_PAGES narrow the sweep as for pytest.  the per-host rate
+# limit (ratelimit_helper.host_rate, host_burst) and test_host_qed.server_workers are for
+# the whole fleet: each process gets its share of them, split between the shards that run
+# at once (the local processes, or every shard when they run on nodes)
+
+fleet_limits = (ratelimit_helper.host_rate, ratelimit_helper.host_burst, dict(test_host_qed.server_workers))
+
+
+def share_limits(parallel):
+    # sets this process's share of the fleet's per-host rate, burst and workers
+    rate, burst, workers = fleet_limits
+    ratelimit_helper.host_rate = rate / parallel
+    ratelimit_helper.host_burst = max(1, burst // parallel)
+    ratelimit_helper.clear()  # limiters are rebuilt with the shared rate
+    test_host_qed.server_workers.update((server, max(1, count // parallel)) for server, count in workers.items())
+    return
+
+
+def sweep_shard(number, count, parallel=None):
+    # sweeps one shard of the selected servers, sharing the fleet limits between 'parallel'
+    # concurrent shards (default: all count); returns its json-ready results
+    share_limits(parallel or count)
+    os.environ["QED_SHARD"] = "{}/{}".format(number, count)
+    start_time = time.perf_counter()
+    sweeps = test_host_qed.fan_out(test_host_qed.selected_servers())
+    results = dict((server, sweep.result().to_dict()) for server, sweep in sweeps.items())
+    return {"shard": number, "count": count, "seconds": time.perf_counter() - start_time,
+            "servers": results}
+
+
+def shard_worker(jobs, done, parallel):
+    # takes shard numbers from jobs until it gets None; puts each shard's results on done
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        number, count = job
+        try:
+            done.put(sweep_shard(number, count, parallel))
+        except Exception as e:
+            done.put({"shard": number, "count": count, "error": "{}: {}".format(type(e).__name__, e)})
+    return
+
+
+def run_local(count, processes=None):
+    # sweeps all count shards with up to 'processes' worker processes; returns shard results
+    processes = min(processes or count, count)
+    jobs, done = multiprocessing.Queue(), multiprocessing.Queue()
+    for number in range(1, count + 1):
+        jobs.put((number, count))
+    for _ in range(processes):
+        jobs.put(None)
+    workers = [multiprocessing.Process(target=shard_worker, args=(jobs, done, processes)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    shards = [done.get() for _ in range(count)]
+    for worker in workers:
+        worker.join()
+    return sorted(shards, key=lambda shard: shard["shard"])
+
+
+def merge(shards):
+    # server -> CheckResults over all shards, rows in target order
+    parts = {}
+    for shard in shards:
+        for server, data in shard.get("servers", {}).items():
+            parts.setdefault(server, []).append(results_helper.CheckResults.from_dict(data))
+    merged = {}
+    for server, server_parts in parts.items():
+        order = [target.url for target in targets_helper.targets("host", [server])]
+        merged[server] = results_helper.CheckResults.combine(server_parts, order)
+    return merged
+
+
+def server_hooks():
+    secrets = test_host_qed.smoketest_secrets
+    return {test_host_qed.pub_server: secrets.pub_server_hook, test_host_qed.internal_server_1: secrets.s1_hook,
+            test_host_qed.internal_server_5: secrets.s5_hook}
+
+
+def report(shards, merged):
+    # prints the shard and server tables and checks each server's merged results once
+    # (sending its alert, if any); returns server -> failure messages
+    rows = [[shard["shard"], round(shard.get("seconds", 0.0), 2),
+             sum(len(data["urls"]) for data in shard.get("servers", {}).values()), shard.get("error", "")]
+            for shard in shards]
+    print(tabulate(rows, ["shard", "seconds", "pages", "error"], tablefmt='grid'))
+    host = test_host_qed.TestQEDHost()
+    hooks = server_hooks()
+    failures = {}
+    for server in sorted(merged):
+        try:
+            host.check_response(merged[server].urls, 200, hooks.get(server), server, response=merged[server])
+        except AssertionError as e:
+            failures[server] = [arg for arg in e.args if isinstance(arg, str)]
+    rows = [[server, len(merged[server]), len(failures.get(server, []))] for server in sorted(merged)]
+    print(tabulate(rows, ["server", "pages", "failures"], tablefmt='grid'))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="sharded qed page sweep")
+    parser.add_argument("--shards", type=int, help="sweep this many shards in local processes, then merge")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per shard)")
+    parser.add_argument("--shard", help="sweep only this shard, e.g. 2/4 (use with --out)")
+    parser.add_argument("--out", help="write the shard's results to this json file")
+    parser.add_argument("--merge", nargs="+", help="merge these shard result files, report and alert")
+    args = parser.parse_args(argv)
+
+    missing = set()
+    if args.shard:
+        number, count = targets_helper.parse_shard(args.shard)
+        shards = [sweep_shard(number, count)]
+        if args.out:
+            with open(args.out, "w") as out:
+                json.dump(shards[0], out)
+            return 0
+    elif args.merge:
+        shards = []
+        for path in args.merge:
+            with open(path) as result_file:
+                shards.append(json.load(result_file))
+        missing = set(range(1, shards[0]["count"] + 1)) - set(shard["shard"] for shard in shards)
+        if missing:
+            print("Missing shards: {}".format(", ".join(str(number) for number in sorted(missing))))
+    else:
+        start_time = time.perf_counter()
+        shards = run_local(args.shards or multiprocessing.cpu_count(), args.processes)
+        print("{} shards swept in {:.2f}s".format(len(shards), time.perf_counter() - start_time))
+    failures = report(shards, merge(shards))
+    return 1 if failures or missing or any("error" in shard for shard in shards) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import atexit
+import json
+import os
+import threading
+import time
+from xml.sax.saxutils import quoteattr
+
+# streaming result sink: every check result is written the moment it is known - one json
+# object per line to QED_RESULTS_JSONL and/or one <testcase> per result to QED_RESULTS_JUNIT
+# - and flushed, so a dashboard can tail a sweep while it runs (tail -f results.jsonl).
+# nothing but a pass/fail tally per test is kept in memory, however many url's are checked.
+# the junit file is valid xml once the run ends (sink.close, called at exit); its totals are
+# written into space reserved at the top of the file, as plain integers followed by blank
+# space inside the start tag.  e.g.:
+#   QED_RESULTS_JSONL=results.jsonl QED_RESULTS_JUNIT=results.xml python -m pytest tests/test_host_qed.py
+
+jsonl_path = os.environ.get("QED_RESULTS_JSONL")
+junit_path = os.environ.get("QED_RESULTS_JUNIT")
+count_width = 10  # characters reserved for each junit total
+
+
+class ResultSink(object):
+    """
+    writes check results to jsonl and/or junit xml files as they arrive (thread safe)
+    """
+
+    def __init__(self, jsonl=None, junit=None, suite="qed"):
+        self._lock = threading.Lock()
+        self.tallies = {}  # test name -> [checked, failed]
+        self.claims = []  # (test name, target prefix) of the results reported by the running test
+        self.claiming = False  # claims are kept only when something takes them (see conftest)
+        self.jsonl = open(jsonl, "a") if jsonl else None
+        self.junit = None
+        self.paths = [path for path in (jsonl, junit) if path]
+        self.started = time.time()
+        if junit:
+            self.junit = open(junit, "w")
+            self.junit.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n<testsuite name={} '.format(
+                             quoteattr(suite)))
+            self._totals_at = self.junit.tell()
+            self.junit.write(self._totals(0, 0, 0.0) + ">\n")
+            self.junit.flush()
+
+    @property
+    def active(self):
+        return self.jsonl is not None or self.junit is not None
+
+    def _totals(self, tests, failures, seconds):
+        # the totals attributes, padded after the last one (whitespace before the tag's '>'
+        # is valid xml) so that the final ones fit in the space written at the start
+        totals = 'tests="{}" failures="{}" time="{:.2f}"'.format(tests, failures, seconds)
+        return totals.ljust(len('tests="" failures="" time=""') + 3 * count_width)
+
+    def tell(self):
+        # current size of the jsonl file (where the next result will be written); None without one
+        with self._lock:
+            return self.jsonl.tell() if self.jsonl is not None else None
+
+    def record(self, test, target, expected, actual, passed=None, latency=None):
+        # writes one result: 'target' (a url, or a row label) was expected to give 'expected'
+        # and gave 'actual'; passed defaults to actual == expected; latency in seconds
+        if passed is None:
+            passed = actual == expected
+        test = test.strip()
+        with self._lock:
+            tally = self.tallies.setdefault(test, [0, 0])
+            tally[0] += 1
+            tally[1] += 0 if passed else 1
+            if self.jsonl is not None:
+                row = {"time": round(time.time(), 3), "test": test, "target": target, "expected": expected,
+                       "actual": actual, "passed": bool(passed)}
+                if latency is not None:
+                    row["latency"] = round(latency, 4)
+                self.jsonl.write(json.dumps(row, default=str) + "\n")
+                self.jsonl.flush()
+            if self.junit is not None:
+                case = "<testcase classname={} name={}".format(quoteattr(test), quoteattr(str(target)))
+                if latency is not None:
+                    case += ' time="{:.4f}"'.format(latency)
+                if passed:
+                    case += "/>\n"
+                else:
+                    case += "><failure message={}/></testcase>\n".format(
+                            quoteattr("expected {} but found {}".format(expected, actual)))
+                self.junit.write(case)
+                self.junit.flush()
+        return
+
+    def recorder(self, test, expected):
+        # returns a callback (target, actual, latency=None) recording results of 'test', e.g.,
+        # for linkcheck_helper.status_chk(..., on_result=...)
+        def on_result(target, actual, latency=None):
+            self.record(test, target, expected, actual, latency=latency)
+        return on_result
+
+    def claim(self, test, prefix=""):
+        # marks the results of 'test' whose target starts with prefix (e.g., a server's url) as
+        # those reported by the running test, wherever (and whenever) they were written
+        if self.claiming:
+            with self._lock:
+                self.claims.append((test.strip(), prefix))
+        return
+
+    def take_claims(self):
+        # returns and clears the claims made since the last call
+        with self._lock:
+            claims, self.claims = self.claims, []
+        return claims
+
+    def tally(self, test):
+        # (checked, failed) so far for 'test'
+        with self._lock:
+            return tuple(self.tallies.get(test.strip(), (0, 0)))
+
+    def close(self):
+        with self._lock:
+            if self.jsonl is not None:
+                self.jsonl.close()
+                self.jsonl = None
+            if self.junit is not None:
+                tests = sum(tally[0] for tally in self.tallies.values())
+                failures = sum(tally[1] for tally in self.tallies.values())
+                self.junit.write("</testsuite>\n</testsuites>\n")
+                self.junit.seek(self._totals_at)
+                self.junit.write(self._totals(tests, failures, time.time() - self.started))
+                self.junit.close()
+                self.junit = None
+        return
+
+
+sink = ResultSink(jsonl_path, junit_path)
+atexit.register(sink.close)
+
+
+def record(test, target, expected, actual, passed=None, latency=None):
+    sink.record(test, target, expected, actual, passed, latency)
+    return
+
+
+def recorder(test, expected):
+    return sink.recorder(test, expected)
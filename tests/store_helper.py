@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+
+# on-disk store of link check results (sqlite), so that repeated runs can skip url's that
+# were checked recently and passed, and can re-check the rest with conditional requests
+# (If-None-Match / If-Modified-Since) instead of downloading them again
+
+
+class ResultStore(object):
+    """
+    sqlite-backed record of the last check of each url: status, etag, last-modified,
+    latency (seconds) and the time it was checked
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                         "url TEXT PRIMARY KEY, status INTEGER, etag TEXT, last_modified TEXT, "
+                         "latency REAL, checked_at REAL)")
+        self._db.commit()
+
+    def get(self, url):
+        # returns the stored result for url as a dict, or None if it has never been checked
+        with self._lock:
+            row = self._db.execute("SELECT status, etag, last_modified, latency, checked_at "
+                                   "FROM results WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "etag": row[1], "last_modified": row[2], "latency": row[3],
+                "checked_at": row[4]}
+
+    def record(self, url, status, etag=None, last_modified=None, latency=None, checked_at=None):
+        if checked_at is None:
+            checked_at = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results "
+                             "(url, status, etag, last_modified, latency, checked_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (url, status, etag, last_modified, latency, checked_at))
+            self._db.commit()
+        return
+
+    @staticmethod
+    def is_current(result, max_age, ok_status=200):
+        # true when a stored result passed and is younger than max_age seconds,
+        # i.e., it need not be re-checked in incremental mode
+        return (result is not None and result["status"] == ok_status
+                and time.time() - result["checked_at"] < max_age)
+
+    @staticmethod
+    def conditional_headers(result):
+        # request headers that let the server answer 304 if the url has not changed
+        headers = {}
+        if result is not None and result["status"] == 200:
+            if result["etag"]:
+                headers["If-None-Match"] = result["etag"]
+            if result["last_modified"]:
+                headers["If-Modified-Since"] = result["last_modified"]
+        return headers
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+        return
+
+
+class ProbeStore(object):
+    """
+    sqlite-backed rolling log of monitor probes (server, url, status, latency, time) kept
+    for keep_seconds, and the last known up/down state of each server
+    """
+
+    def __init__(self, path, keep_seconds=7 * 24 * 3600):
+        self.path = path
+        self.keep_seconds = keep_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS probes ("
+                         "server TEXT, url TEXT, status TEXT, latency REAL, checked_at REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS probes_checked_at ON probes (checked_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS states ("
+                         "server TEXT PRIMARY KEY, state TEXT, since REAL)")
+        self._db.commit()
+
+    def record(self, server, rows, checked_at=None):
+        # rows: (url, status, latency) for one sweep of server; probes older than
+        # keep_seconds are dropped at the same time
+        if checked_at is None:
+            checked_at = time.time()
+        with self._lock:
+            self._db.executemany("INSERT INTO probes (server, url, status, latency, checked_at) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 [(server, url, str(status), latency, checked_at) for url, status, latency in rows])
+            self._db.execute("DELETE FROM probes WHERE checked_at < ?", (checked_at - self.keep_seconds,))
+            self._db.commit()
+        return
+
+    def state(self, server):
+        # returns (state, since) as last saved for server, or (None, None)
+        with self._lock:
+            row = self._db.execute("SELECT state, since FROM states WHERE server = ?", (server,)).fetchone()
+        return row if row is not None else (None, None)
+
+    def save_state(self, server, state, since=None):
+        if since is None:
+            since = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO states (server, state, since) VALUES (?, ?, ?)",
+                             (server, state, since))
+            self._db.commit()
+        return
+
+    def history(self, server, since):
+        # (url, status, latency, checked_at) rows for server probed since 'since', oldest first
+        with self._lock:
+            return self._db.execute("SELECT url, status, latency, checked_at FROM probes "
+                                    "WHERE server = ? AND checked_at >= ? ORDER BY checked_at",
+                                    (server, since)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+        return
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# a small local stand-in for the qed servers, used by the benchmark scripts so that
+# timing comparisons can be made without touching qed.epa.gov
+# routes:
+#   .../<model>/input - model input page: a search bar form followed by the input form,
+#                       which posts to .../<model>/output; the output page (h2 model_header
+#                       "<MODEL> Output") is returned after run_seconds
+#   .../<model>/qaqc  - qaqc page whose runQAQC button is wired up by an inline script to
+#                       open .../<model>/qaqc/run, the qaqc results page
+#   /fast            - responds 200 immediately
+#   /slow/<seconds>  - waits <seconds> then responds 200
+#   /status/<code>   - responds with the given status code (429 and 503 with Retry-After: 1)
+#   /busy/<n>/...    - responds 429 (Retry-After: 1) to the first <n> requests for the path,
+#                      then 200
+#   /missing/...     - a "File Not Found" page served with a 200, as pub does
+#   /big/<kb>        - responds 200 with a <kb> kilobyte body (e.g., a pdf reference)
+#   /nohead/<route>  - as <route>, but HEAD is rejected with 405
+#   /site/<path>     - a small site to crawl: each page links to three child pages (up
+#                      to four levels deep), its parent, a page fragment, a broken link
+#                      and an external link
+#   /secure/<route>  - as <route>, but requires login: without the session cookie the
+#                      login form (form name="auth") is returned; posting it sets the cookie
+#   /hooks/<name>    - POST only: a slack style webhook; the json bodies posted are kept in
+#                      StubHandler.hook_posts as (path, body), and the next hook_failures
+#                      posts are answered 503 (with Retry-After: 1) instead
+# anything else responds 200 with a plain page, so the full qed page matrix can be pointed
+# at the stub.  200 responses carry an etag and honor If-None-Match (304)
+
+
+login_page = b"""<html><body>
+<form name="auth" method="post"><input name="username"/><input name="password" type="password"/>
+<input type="submit"/></form></body></html>"""
+
+input_page = """<html><body><form name="search" action="/search"><input name="q"/></form>
+<h2 class="model_header">{model} Inputs</h2>
+<form method="post" action="output"><input name="chemical_name" value="default"/>
+<input name="application_rate" value="1.0"/><button class="submit input_button" type="submit">Submit</button>
+</form></body></html>"""
+
+qaqc_page = """<html><body><h2 class="model_header">{model} QAQC</h2>
+<button id="runQAQC" class="input_button">Run QAQC</button>
+<script>$('#runQAQC').click(function () {{ window.location.href = 'qaqc/run'; }});</script>
+</body></html>"""
+
+site_page = """<html><body><a href="#top">top</a><a href="{parent}">up</a>{children}
+<a href="/status/404">broken</a><a href="http://external.invalid/">external</a></body></html>"""
+
+output_page = """<html><body><h2 class="model_header">{model} Output</h2>
+<table><tr><th>User Inputs</th></tr><tr><td>{inputs}</td></tr></table></body></html>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    request handler for the stub server; every response carries a short html body
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive, as served by the real front end
+    session_cookie = "stubsession=1"
+    logins = 0  # count of successful login posts (across all handlers)
+    run_seconds = 0.0  # simulated model run time for output pages
+    hook_posts = []  # (path, decoded json body) for each webhook post accepted
+    hook_failures = 0  # webhook posts still to be refused with a 503
+    busy_counts = {}  # /busy/ path -> requests answered so far
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+    def route(self):
+        # returns (status code, body) for the request path
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts[0] == 'nohead':
+            if self.command == 'HEAD':
+                return 405, self.plain(405)
+            parts = parts[1:]
+        if parts[0] == 'fast':
+            return 200, self.plain(200)
+        elif parts[0] == 'slow' and len(parts) > 1:
+            time.sleep(float(parts[1]))
+            return 200, self.plain(200)
+        elif parts[0] == 'status' and len(parts) > 1:
+            return int(parts[1]), self.plain(int(parts[1]))
+        elif parts[0] == 'busy' and len(parts) > 1:
+            seen = StubHandler.busy_counts.get(self.path, 0)
+            StubHandler.busy_counts[self.path] = seen + 1
+            code = 429 if seen < int(parts[1]) else 200
+            return code, self.plain(code)
+        elif parts[0] == 'missing':
+            return 200, b"<html><body><h1>File Not Found</h1></body></html>"
+        elif parts[0] == 'big' and len(parts) > 1:
+            return 200, b"x" * (int(parts[1]) * 1024)
+        elif parts[0] == 'site':
+            path = "/" + "/".join(parts)
+            children = "".join('<a href="{0}/{1}">{1}</a>'.format(path, child) for child in range(3)) \
+                if len(parts) < 5 else ""
+            return 200, site_page.format(parent="/" + "/".join(parts[:-1] or parts), children=children).encode()
+        elif len(parts) > 1 and parts[-1] == 'input':
+            return 200, input_page.format(model=parts[-2].upper()).encode()
+        elif len(parts) > 1 and parts[-1] == 'qaqc':
+            return 200, qaqc_page.format(model=parts[-2].upper()).encode()
+        elif len(parts) > 2 and parts[-2:] == ['qaqc', 'run']:
+            return 200, output_page.format(model=parts[-3].upper() + " QAQC", inputs="qaqc").encode()
+        return 200, self.plain(200)
+
+    @staticmethod
+    def plain(code):
+        return "<html><body>{}</body></html>".format(code).encode()
+
+    def send_body(self, code, body):
+        etag = '"{}-{}"'.format(code, len(body))
+        if code == 200 and self.headers.get('If-None-Match') == etag:
+            code, body = 304, b""
+        self.send_response(code)
+        if code in (200, 304):
+            self.send_header('ETag', etag)
+        if code in (429, 503):
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def logged_in(self):
+        return self.session_cookie in (self.headers.get('Cookie') or "")
+
+    def do_GET(self):
+        if self.path.startswith('/secure/'):
+            if not self.logged_in():
+                return self.send_body(200, login_page)
+            self.path = self.path[len('/secure'):]
+        code, body = self.route()
+        self.send_body(code, body)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length).decode()
+        if self.path.startswith('/hooks/'):
+            if StubHandler.hook_failures > 0:
+                StubHandler.hook_failures -= 1
+                return self.send_body(503, self.plain(503))
+            StubHandler.hook_posts.append((self.path, json.loads(data)))
+            return self.send_body(200, b"ok")
+        form = parse_qs(data)
+        cookie = None
+        if self.path.startswith('/secure/'):
+            self.path = self.path[len('/secure'):]
+            if 'username' in form and 'password' in form:
+                StubHandler.logins += 1
+                cookie = self.session_cookie + "; Path=/"
+            elif not self.logged_in():
+                return self.send_body(200, login_page)
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if cookie is None and len(parts) > 1 and parts[-1] == 'output':
+            time.sleep(self.run_seconds)
+            inputs = ", ".join(sorted(form))
+            code, body = 200, output_page.format(model=parts[-2].upper(), inputs=inputs).encode()
+        else:
+            code, body = self.route()
+        self.send_response(code)
+        if cookie is not None:
+            self.send_header('Set-Cookie', cookie)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients may drop the connection early (e.g., a streamed GET closed after the headers)
+
+
+def start(port=0, handler=StubHandler):
+    # starts a stub server on a background thread and returns (server, base_url);
+    # port 0 lets the os pick a free port.  call server.shutdown() when finished
+    server = StubServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
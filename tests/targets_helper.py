@@ -0,0 +1,163 @@
+import os
+import zlib
+from collections import namedtuple
+from . import results_helper
+
+# the pages the smoke tests check, described once: servers, models/modules and pages, and
+# for each suite (test_host_qed, the link tests, testing_ground) which combinations of them
+# it covers, with per-server exclusions.  targets() expands a suite lazily into Target
+# tuples, so importing a test module builds no url lists; filters by server, model and page
+# let a run cover just part of the matrix, e.g.:
+#   QED_SERVERS=pub QED_MODELS=sip,trex QED_PAGES=input python -m pytest tests/test_host_qed.py
+# and QED_SHARD=2/4 keeps the second of four shards (see shard_of and shard_qed)
+
+Target = namedtuple("Target", ["suite", "server", "model", "page", "url", "title", "login", "verify"])
+# server: server url (e.g., https://qed.epa.gov/); model, page: as results_helper.url_parts
+# (e.g., "sip", "input"); title: the model's page title (e.g., "SIP"), "" if not known;
+# login: the page sits behind the login form; verify: check the server's ssl certificate
+
+#servers: url, login (input pages sit behind the login form), verify (ssl certificate), and
+#modules to leave out or rename on that server
+server_specs = {
+    "pub": {"url": "https://qed.epa.gov/", "login": True, "verify": True,
+            "exclude": ["hwbi/"],
+            "rename": {"wiki": "wiki/"}},  #'rest' 'api' 'source' can't have the trailing slashes or they fail
+    "s1": {"url": "https://qedinternal.epa.gov/", "login": False, "verify": True},
+    "s5": {"url": "http://134.67.114.5/", "login": False, "verify": False},
+    #ubertool front ends (qed, qedinternal) and back ends (.3, .1) used by the link and selenium tests
+    "uber_pub": {"url": "http://qed.epa.gov/ubertool/", "login": True, "verify": True},
+    "uber_internal": {"url": "http://qedinternal.epa.gov/ubertool/", "login": False, "verify": True},
+    "uber_3": {"url": "http://134.67.114.3/ubertool/", "login": True, "verify": True},
+    "uber_1": {"url": "http://134.67.114.1/ubertool/", "login": False, "verify": True},
+    "internal": {"url": "http://qedinternal.epa.gov/", "login": False, "verify": True},
+}
+
+#pram models with their page titles (e.g., the "<title> Output" model header)
+pram_models = [("agdrift/", "AgDrift"), ("beerex/", "Bee-REX"), ("iec/", "IEC"), ("sip/", "SIP"),
+               ("stir/", "STIR"), ("terrplant/", "TerrPlant"), ("therps/", "T-HERPS"), ("trex/", "T-REX 1.5.2"),
+               ("kabam/", "KABAM"), ("rice/", "RICE"), ("agdisp/", "Agdisp"), ("earthworm/", "Earthworm"),
+               ("insect/", "Insect"), ("pat/", "Pat"), ("perfum/", "Perfum"), ("pfam/", "Pfam"),
+               ("pwc/", "PWC"), ("sam/", "SAM"), ("ted/", "TED"), ("varroapop/", "VarroaPop")]
+models = [m for m, title in pram_models]
+models_IO = [title for m, title in pram_models]
+models_nonbeta = models[:10]
+
+#track active hms subpages
+hms_subpages = ['hms/watershed_workflow/', 'hms/meteorology/', 'hms/solarcalculator/', 'hms/hydrology/', 'hms/hms/hydrology/evapotranspiration/',
+                'hms/hydrology/precipitation/', 'hms/hydrology/soilmoisture/', 'hms/hydrology/subsurfaceflow/',
+                'hms/hydrology/surfacerunoff/', 'hms/hydrology/temperature/', 'hms/water_quality/', 'hms/api_doc/',
+                'hms/Documents/', 'hms/precip_compare/', 'hms/runoff_compare/']
+
+#note that 'rest' 'api' 'source' and 'wiki' can't have the trailing slashes or they fail
+non_pram_modules = ["pram/", "pram/links/", "cts/", "hms/", 'pisces/', 'pisces/watershed/', 'pisces/stream/', 'pisces/species/', 'pisces/algorithms/',
+                    'pisces/references/','hwbi/', 'wqt/', 'cyan/', 'api', 'rest', 'source', 'wiki'] + hms_subpages
+                    #note that rest can't have the trailing slash or it tries to proxy to backend
+
+pages = ["","input", "algorithms", "references"] #for now leaving out "qaqc" page
+
+#models on the ubertool servers with description/reference tabs
+tab_models = [("sip/", "SIP"), ("stir/", "STIR"), ("rice/", "RICE"), ("terrplant/", "TerrPlant"), ("iec/", "IEC"),
+              ("agdrift/", "AgDrift"), ("agdrift_trex/", "AgDrift & T-REX"), ("agdrift_therps/", "AgDrift & T-HERPS"),
+              ("earthworm/", "Earthworm"), ("kabam/", "KABAM"), ("pfam/", "PFAM"), ("sam/", "SAM"),
+              ("therps/", "T-Herps"), ("trex2/", "T-REX 1.5.2")]
+#models driven through the input/output/qaqc forms by testing_ground (a short list, for debugging)
+form_models = [("sip/", "SIP"), ("stir/", "STIR"), ("pfam/", "PFAM"), ("earthworm/", "Earthworm")]
+
+#suites: each is a list of blocks; a block covers its servers x (models x pages, prefixed)
+#or its servers x modules
+suites = {
+    #test_host_qed: all pram model pages, then the non-pram modules, of each server
+    "host": [{"servers": ["pub", "s1", "s5"], "prefix": "pram/", "models": pram_models, "pages": pages},
+             {"servers": ["pub", "s1", "s5"], "modules": non_pram_modules}],
+    #test_page_links_qed: the ubertool main page
+    "main": [{"servers": ["internal"], "modules": ["ubertool"]}],
+    #test_tab_links_qed: model description and reference tabs
+    "tabs": [{"servers": ["uber_pub", "uber_internal"], "models": tab_models,
+              "pages": ["descriptions", "references"]}],
+    #testing_ground: input pages of the servers that redirect to the login form, and qaqc pages
+    "input": [{"servers": ["uber_pub", "uber_3"], "models": form_models, "pages": ["input"]}],
+    "qaqc": [{"servers": ["uber_pub", "uber_internal", "uber_3", "uber_1"], "models": form_models,
+              "pages": ["qaqc"]}],
+}
+
+
+def server_url(name):
+    # returns the url for a server's short name (pub, s1, ...); anything else is returned as is
+    return server_specs[name]["url"] if name in server_specs else name
+
+
+def split_names(value):
+    # "a, b" -> ["a", "b"]; None or "" -> None (no filter)
+    if not value:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def parse_shard(value):
+    # "2/4" -> (2, 4); None or "" -> None (all shards)
+    if not value:
+        return None
+    number, count = [int(part) for part in value.split("/")]
+    if not 1 <= number <= count:
+        raise ValueError("shard {} is not one of 1/{}..{}/{}".format(value, count, count, count))
+    return number, count
+
+
+def shard_of(url, count):
+    # the shard (1..count) a url belongs to: fixed by the url alone, so every process or
+    # node, whatever else it filters, agrees on the split
+    return zlib.crc32(url.encode("utf-8")) % count + 1
+
+
+def env_filters():
+    # filters from QED_SERVERS, QED_MODELS and QED_PAGES (comma separated) and QED_SHARD,
+    # for targets()
+    return {"servers": split_names(os.environ.get("QED_SERVERS")),
+            "models": split_names(os.environ.get("QED_MODELS")),
+            "pages": split_names(os.environ.get("QED_PAGES")),
+            "shard": parse_shard(os.environ.get("QED_SHARD"))}
+
+
+def block_urls(block, name):
+    # yields (url path, title) for a block on one server
+    spec = server_specs[name]
+    if "modules" in block:
+        for module in block["modules"]:
+            if module not in spec.get("exclude", ()):
+                yield spec.get("rename", {}).get(module, module), ""
+    else:
+        for model, title in block["models"]:
+            for page in block["pages"]:
+                yield block.get("prefix", "") + model + page, title
+
+
+def targets(suite, servers=None, models=None, pages=None, shard=None):
+    # yields the suite's targets, in spec order; servers (short names or urls), models and
+    # pages (as in Target, e.g., "sip" and "input"; "" for a main page) restrict the output,
+    # as does shard, (number, count), to the targets in that shard
+    server_filter = set(server_url(name) for name in servers) if servers is not None else None
+    for block in suites[suite]:
+        for name in block["servers"]:
+            spec = server_specs[name]
+            if server_filter is not None and spec["url"] not in server_filter:
+                continue
+            for path, title in block_urls(block, name):
+                url = spec["url"] + path
+                server, model, page = results_helper.url_parts(url)
+                if models is not None and model not in models:
+                    continue
+                if pages is not None and page.strip("/") not in pages:
+                    continue
+                if shard is not None and shard_of(url, shard[1]) != shard[0]:
+                    continue
+                yield Target(suite, spec["url"], model, page, url, title, spec["login"], spec["verify"])
+
+
+def suite_servers(suite):
+    # server urls used by a suite, in spec order
+    names = []
+    for block in suites[suite]:
+        for name in block["servers"]:
+            if server_specs[name]["url"] not in names:
+                names.append(server_specs[name]["url"])
+    return names
@@ -1,76 +1,130 @@
-import requests
 import unittest
 import numpy.testing as npt
 from bs4 import BeautifulSoup
 import mechanicalsoup # for populating and submitting input data forms
 import unicodedata
 from tabulate import tabulate
+from . import alert_helper
+from . import auth_helper
+from . import baseline_helper
 from . import linkcheck_helper
+from . import ratelimit_helper
+from . import results_helper
+from . import session_helper
+from . import sink_helper
+from . import targets_helper
+from . import timing_helper
 from . import smoketest_secrets
 import numpy as np
-import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
-pub_server = "https://qed.epa.gov/"
-internal_server_1 = "https://qedinternal.epa.gov/"
-internal_server_5 = "http://134.67.114.5/"
+#servers, models and pages are declared once in targets_helper (suite "host"); a server's
+#page list is built from its targets when its sweep starts, narrowed by QED_MODELS/QED_PAGES
+pub_server = targets_helper.server_url("pub")
+internal_server_1 = targets_helper.server_url("s1")
+internal_server_5 = targets_helper.server_url("s5")
 
+servers = targets_helper.suite_servers("host")
 
-servers = [pub_server, internal_server_1, internal_server_5]
+#the server each test checks; setUpClass sweeps only the servers of the tests selected to run
+server_tests = {"test_pub_server_200": pub_server, "test_internal_s1_200": internal_server_1,
+                "test_interval_s5_200": internal_server_5}
 
-models = ["agdrift/", "beerex/", "iec/", "sip/", "stir/", 'terrplant/', 'therps/', 'trex/',
-          'kabam/', 'rice/', 'agdisp/', 'earthworm/', 'insect/', 'pat/', 'perfum/', 'pfam/',
-          'pwc/', 'sam/', 'ted/', 'varroapop/']
+#logged-in sessions for servers that put pages behind the login form (logs in once per server)
+auth_browsers = auth_helper.AuthenticatedBrowsers(smoketest_secrets.qed_user, smoketest_secrets.qed_pass)
 
-models_nonbeta = ["agdrift/", "beerex/", "iec/", "sip/", "stir/", 'terrplant/', 'therps/', 'trex/',
-          'kabam/', 'rice/']
+#concurrent requests allowed against each server; the servers are independent machines,
+#so each gets its own budget and all three are swept at the same time
+server_workers = {pub_server: 4, internal_server_1: 8, internal_server_5: 8}
 
+#latency budgets (seconds) for a page check; keys are page names ("" is a model's main page)
+#or full urls for single-page overrides. a page that returns 200 but takes longer fails
+page_budgets = {"": 10, "input": 10, "algorithms": 10, "references": 10}
+default_budget = 15 #for pages not listed above (non-pram modules, hms subpages, ...)
 
-models_IO = ["AgDrift", "Bee-REX", "IEC", "SIP", "STIR", "TerrPlant", "T-HERPS", 'T-REX 1.5.2',
-                 "KABAM", "RICE", "Agdisp", "Earthworm", "Insect", "Pat", "Perfum", "Pfam",
-                 "PWC", "SAM", "TED", "VarroaPop"]
+#latency baseline file (QED_BASELINE); when set, each server's per-model p95 latency is
+#compared with the last good run and regressions are reported like outages
+baseline_path = os.environ.get("QED_BASELINE")
 
-#track active hms subpages
-hms_subpages = ['hms/watershed_workflow/', 'hms/meteorology/', 'hms/solarcalculator/', 'hms/hydrology/', 'hms/hms/hydrology/evapotranspiration/',
-                'hms/hydrology/precipitation/', 'hms/hydrology/soilmoisture/', 'hms/hydrology/subsurfaceflow/',
-                'hms/hydrology/surfacerunoff/', 'hms/hydrology/temperature/', 'hms/water_quality/', 'hms/api_doc/',
-                'hms/Documents/', 'hms/precip_compare/', 'hms/runoff_compare/']
 
-#note that 'rest' 'api' 'source' and 'wiki' can't have the trailing slashes or they fail
-non_pram_modules = ["pram/", "pram/links/", "cts/", "hms/", 'pisces/', 'pisces/watershed/', 'pisces/stream/', 'pisces/species/', 'pisces/algorithms/',
-                    'pisces/references/','hwbi/', 'wqt/', 'cyan/', 'api', 'rest', 'source', 'wiki'] + hms_subpages
-                    #note that rest can't have the trailing slash or it tries to proxy to backend
+def selected_servers():
+    #QED_SERVERS selects the servers to sweep by short name (pub, s1, s5; e.g., QED_SERVERS=pub
+    #to sweep only the public server when running pytest -k pub); default is all servers
+    names = targets_helper.env_filters()["servers"]
+    if not names:
+        return servers
+    return [targets_helper.server_url(name) for name in names]
 
-#note that 'rest' 'api' 'source'  can't have the trailing slashes or they fail
-non_pram_modules_public = ["pram/", "pram/links/", "cts/", "hms/", 'pisces/', 'pisces/watershed/', 'pisces/stream/', 'pisces/species/',
-                           'pisces/algorithms/','pisces/references/', 'wqt/', 'cyan/', 'api', 'rest', 'source',
-                           'wiki/'] + hms_subpages
 
+def sweep_targets(server):
+    #the server's targets in the "host" suite, narrowed by QED_MODELS, QED_PAGES and QED_SHARD
+    filters = targets_helper.env_filters()
+    return list(targets_helper.targets("host", [server], filters["models"], filters["pages"], filters["shard"]))
 
-pages = ["","input", "algorithms", "references"] #for now leaving out "qaqc" page
 
+def page_budget(url):
+    #latency budget (seconds) for a page, as applied by CheckResults.budgets
+    return page_budgets.get(url, page_budgets.get(results_helper.url_parts(url)[2], default_budget))
 
-#all pram models
-pub_model_pages_pram = [pub_server + 'pram/' + m + p for m in models for p in pages]
-s1_model_pages_pram = [internal_server_1  + 'pram/' + m + p for m in models for p in pages]
-s5_model_pages_pram = [internal_server_5  + 'pram/' + m + p for m in models for p in pages]
 
-
-#non-beta pram only
-pub_model_pages_pram_nonbeta = [pub_server  + 'pram/'+ m + p for m in models_nonbeta for p in pages]
-s1_model_pages_pram_nonbeta = [internal_server_1  + 'pram/'+ m + p for m in models_nonbeta for p in pages]
-s5_model_pages_pram_nonbeta = [internal_server_5 + 'pram/' + m + p for m in models_nonbeta for p in pages]
-
-
-#non-pram modules
-pub_model_pages_other = [pub_server + m for m in non_pram_modules_public]
-s1_model_pages_other = [internal_server_1  + m for m in non_pram_modules]
-s5_model_pages_other= [internal_server_5  + m for m in non_pram_modules]
-
-#combine pram pages and the base-level non-pram modules
-pub_model_pages = pub_model_pages_pram + pub_model_pages_other
-s1_model_pages = s1_model_pages_pram + s1_model_pages_other
-s5_model_pages = s5_model_pages_pram + s5_model_pages_other
+def check_page(val, login=False, verify=True):
+    #returns the status code (or "Error") of one page and its latency, less any rate limit waits
+    start_time = time.perf_counter()
+    queued = timing_helper.waited()
+    try:
+        if login:
+            status = auth_browsers.open(val).status_code
+        else:
+            status = linkcheck_helper.page_status(val, verify=verify)
+    except ratelimit_helper.HostDown:
+        status = ratelimit_helper.down_status #not requested: too many connection failures
+    except Exception:
+        status = "Error" #if MaxRetries error or other connection error
+    return status, time.perf_counter() - start_time - (timing_helper.waited() - queued)
+
+
+def page_responses(page_list, login=False, verify=True, workers=1, on_result=None):
+    #returns results_helper.CheckResults holding the status code (or "Error") and the
+    #latency of each page in page_list, using up to 'workers' concurrent requests;
+    #on_result(url, status, seconds) is called as each page's check completes
+    def page_response(val):
+        if login:
+            print(val)
+        status, seconds = check_page(val, login, verify)
+        if on_result is not None:
+            on_result(val, status, seconds)
+        return status, seconds
+    checked = []
+    if page_list:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(page_list)))) as pool:
+            checked = list(pool.map(page_response, page_list))
+    return results_helper.CheckResults.from_responses(page_list, [c[0] for c in checked],
+                                                      [c[1] for c in checked])
+
+
+def record_page(url, status, seconds):
+    #streams a sweep result to the result sink (sink_helper) as soon as it is known
+    sink_helper.record("Model page access", url, 200, status, status == 200 and seconds <= page_budget(url),
+                       seconds)
+    return
+
+
+def fan_out(server_list):
+    #starts the page sweep for every server in server_list at once; returns server -> future
+    pool = ThreadPoolExecutor(max_workers=max(1, len(server_list)))
+    sweeps = {}
+    for server in server_list:
+        targets = sweep_targets(server)
+        page_list = [target.url for target in targets]
+        login = any(target.login for target in targets)
+        verify = all(target.verify for target in targets)
+        sweeps[server] = pool.submit(page_responses, page_list, login, verify, server_workers.get(server, 1),
+                                     record_page if sink_helper.sink.active else None)
+    pool.shutdown(wait=False)
+    return sweeps
 
 
 
@@ -83,35 +137,44 @@ class TestQEDHost(unittest.TestCase):
     that the web pages are up and operational.
     """
 
+    selected_tests = None #names of the tests pytest selected (set by conftest); None: all of them
+
     def setup(self):
         pass
 
     def teardown(self):
         pass
 
+    @classmethod
+    def setUpClass(cls):
+        #sweep the selected servers in parallel; each test waits only on its own server.  servers
+        #whose tests were deselected (e.g., pytest -k pub) are not swept
+        wanted = set(servers)
+        if cls.selected_tests is not None:
+            wanted = set(server_tests[name] for name in cls.selected_tests if name in server_tests)
+        cls.sweeps = fan_out([server for server in selected_servers() if server in servers and server in wanted])
+
+    def sweep_result(self, server):
+        #returns the status codes from the server's sweep (running it now if it was not fanned out)
+        if server not in self.sweeps:
+            self.sweeps.update(fan_out([server]))
+        return self.sweeps[server].result()
+
+    @classmethod
+    def tearDownClass(cls):
+        session_helper.report_connections()
+        session_helper.report_transfer()
+        ratelimit_helper.report()
+        timing_helper.report("server")
+        timing_helper.report("model")
+        auth_browsers.report()
+        alert_helper.alerts.flush() #the checks are done: send any alerts still waiting out the window
+        alert_helper.alerts.report()
+
     def send_slack_message(self,message, hook_url, server = None):
-        pages_down = message.count('\n') + 1
-        if pages_down > 2:
-            if server is not None:
-                body = {"text": "There are *" + str(pages_down) + "* pages down on " + server,
-                        "attachments": [
-                            {
-                                "text": message
-                            }
-                        ]
-                        }
-            else:
-                body = {"text": "There are " + str(pages_down) + " pages down.",
-                        "attachments": [
-                            {
-                                "text": message
-                            }
-                        ]
-                        }
-        else:
-            body = {"text": message}
-        url = hook_url
-        response = requests.post(url, data=json.dumps(body), headers={'Content-type': 'application/json'})
+        #queues the alert and returns at once; alert_helper posts it from a background thread,
+        #coalesced with other servers' and tests' alerts (body format: alert_helper.slack_body)
+        alert_helper.alerts.put(hook_url, message, server)
         return
 
 
@@ -126,48 +189,33 @@ class TestQEDHost(unittest.TestCase):
         else:
             return message
 
-    def check_response(self, page_list, code, hook_url=None, server=None, login=False, verify=True):
+    def check_response(self, page_list, code, hook_url=None, server=None, login=False, verify=True, response=None):
+        #response: results already collected for page_list (e.g., by fan_out) as CheckResults or
+        #a list of status codes; fetched here if None.  pages over their latency budget fail, as
+        #do per-model p95 regressions against the baseline (when QED_BASELINE is set)
         test_name = "Model page access "
-        if login:
-            response = [None for x in range(0, len(page_list))]
-            for x, val in enumerate(page_list):
-                print(val)
-                br = mechanicalsoup.StatefulBrowser(raise_on_404=False)
-                initial_response = br.open(val)
-                if initial_response.status_code < 400:
-                    # login and authenticate
-                    try:
-                        br.select_form('form[name="auth"]')
-                        br["username"] = smoketest_secrets.qed_user
-                        br["password"] = smoketest_secrets.qed_pass
-                        response2 = br.submit_selected()
-                        response[x] = response2.status_code
-                    except mechanicalsoup.utils.LinkNotFoundError as e:
-                        response[x] = 404 #No login when expected = 404 (patch until status code update goes live)
-                else:
-                    response[x] = initial_response.status_code
+        sink_helper.sink.claim(test_name, server or "") #this server's sweep rows belong to the calling test
+        if response is None:
+            response = page_responses(page_list, login, verify)
+        if isinstance(response, results_helper.CheckResults):
+            results = response
         else:
-            response = [None for x in range(0, len(page_list))]
-            for x, val in enumerate(page_list):
-                try:
-                    response[x] = requests.get(page_list[x], verify=verify).status_code
-                except Exception as e:
-                    response[x] = "Error" #if MaxRetries error or other connection error
+            results = results_helper.CheckResults.from_responses(page_list, response)
+        percentiles = results.group_percentile(code)
+        found = baseline_helper.regressions(percentiles, baseline_helper.load(baseline_path))
         try:
-            assert all(resp == code for resp in response)
-                # assert(npt.assert_array_equal(response, 200, '200 error', True)
+            assert not results.failed(code, page_budgets, default_budget).any() and not found
         except AssertionError as e:
-            fail_indices = np.where(np.array([resp != code for resp in response]))
-            print(fail_indices)
-            fails = [page_list[i] for i in np.nditer(fail_indices)]
-            codes = [response[i] for i in np.nditer(fail_indices)]
-            message = tuple(["Http response failed for: " + str(x) + ". Expecting *" + str(code) + "* but found *" +
-                             str(y) + "*." for x, y in zip(fails, codes)])
+            print(results.summary(code, page_budgets, default_budget))
+            message = results.failure_messages(code, page_budgets, default_budget) + \
+                      baseline_helper.regression_messages(found)
             slack_message = self.are_all_down("\n".join(message), page_list, server)
             if hook_url is not None:
                 self.send_slack_message(slack_message, hook_url, server)
             e.args += message
             raise
+        if baseline_path:
+            baseline_helper.save(baseline_path, percentiles) #this run becomes the last good run
         return
 
 
@@ -175,15 +223,21 @@ class TestQEDHost(unittest.TestCase):
 
     #THE TESTS
     def test_pub_server_200(self):
-        self.check_response(pub_model_pages, 200, smoketest_secrets.pub_server_hook, pub_server, login=True)
+        results = self.sweep_result(pub_server)
+        self.check_response(results.urls, 200, smoketest_secrets.pub_server_hook, pub_server, login=True,
+                            response=results)
         return
 
     def test_internal_s1_200(self):
-        self.check_response(s1_model_pages, 200, smoketest_secrets.s1_hook, internal_server_1)
+        results = self.sweep_result(internal_server_1)
+        self.check_response(results.urls, 200, smoketest_secrets.s1_hook, internal_server_1,
+                            response=results)
         return
 
     def test_interval_s5_200(self):
-        self.check_response(s5_model_pages, 200, smoketest_secrets.s5_hook, internal_server_5, verify=False)
+        results = self.sweep_result(internal_server_5)
+        self.check_response(results.urls, 200, smoketest_secrets.s5_hook, internal_server_5, verify=False,
+                            response=results)
 
 
 
@@ -194,37 +248,22 @@ class TestQEDHost(unittest.TestCase):
             response = [None for x in range(0,len(page_list))]
             for x, val in enumerate(page_list):
                 print(val)
-                br = mechanicalsoup.StatefulBrowser(raise_on_404=False)
-                initial_response = br.open(val)
-                if initial_response.status_code < 400:
-                    #login and authenticate
-                    br.select_form('form[name="auth"]')
-                    br["username"] = smoketest_secrets.qed_user
-                    br["password"] = smoketest_secrets.qed_pass
-                    response2 = br.submit_selected()
-                    response[x] = response2.status_code
-                    br.form = (br.select_form(1))  # select the second form on the page (skipping search bar form)
-                    response3 = br.submit_selected()  # use mechanize to post input data
-                    response3.get_data()
+                #login once per server (auth_browsers) and post the default input data
+                output = auth_browsers.submit(val)
+                response[x] = output.status_code
+                if output.status_code < 400:
                     # Verify we have successfully posted input data and that we have arrived at the output page
-                    soup = BeautifulSoup(response3, "html.parser")
-                    tag = [a.find(text=True) for a in soup.findAll('h2', {'class': 'model_header'})]
-                    current_title = val.replace("input", "") + ": " + str(tag[0])
-                    expected_title = val.replace("input", "") + ": " + redirect_models[idx] + " Output"
-                else:
-                    response[x] = "fail"
+                    header = output.soup.select_one('h2.model_header') if getattr(output, "soup", None) else None
+                    if header is None or "Output" not in header.get_text():
+                        response[x] = "fail"
         else:
-            response = [requests.get(m, verify=verify).status_code for m in page_list]
+            response = [session_helper.get(m, verify=verify).status_code for m in page_list]
+        results = results_helper.CheckResults.from_responses(page_list, response)
         try:
-            assert all(resp == code for resp in response)
-                #assert(npt.assert_array_equal(response, 200, '200 error', True)
+            assert not results.failed(code).any()
         except AssertionError as e:
-            fail_indices = np.where(np.array([resp != code for resp in response]))
-            print(fail_indices)
-            fails = [page_list[i] for i in np.nditer(fail_indices)]
-            codes = [response[i] for i in np.nditer(fail_indices)]
-            message = tuple(["Http response failed for: " + str(x) + ". Expecting *" + str(code) + "* but found *" +
-                             str(y) + "*." for x, y  in zip(fails,codes)])
+            print(results.summary(code))
+            message = results.failure_messages(code)
             slack_message = self.are_all_down("\n".join(message), page_list, server)
             if hook_url is not None:
                 self.send_slack_message(slack_message, hook_url, server)
@@ -0,0 +1,49 @@
+import unittest
+from . import linkcheck_helper
+
+#offline checks of the link resolution used by every link test (no network needed)
+
+page = "http://qed.example.gov/ubertool/sip/"
+
+
+class TestResolveUrl(unittest.TestCase):
+    """
+    resolve_url and build_http_links against the link forms found on the qed pages
+    """
+
+    def test_relative_links(self):
+        self.assertEqual(linkcheck_helper.resolve_url(page, "../rice/"), "http://qed.example.gov/ubertool/rice/")
+        self.assertEqual(linkcheck_helper.resolve_url(page, "input"), "http://qed.example.gov/ubertool/sip/input")
+        self.assertEqual(linkcheck_helper.resolve_url(page, "/cts/"), "http://qed.example.gov/cts/")
+
+    def test_query_and_fragment_only(self):
+        self.assertEqual(linkcheck_helper.resolve_url(page, "?page=2"), "http://qed.example.gov/ubertool/sip/?page=2")
+        self.assertEqual(linkcheck_helper.resolve_url(page, "#top"), page)
+
+    def test_protocol_relative(self):
+        self.assertEqual(linkcheck_helper.resolve_url("https://qed.example.gov/", "//cdn.example.com/x.js"),
+                         "https://cdn.example.com/x.js")
+
+    def test_normalized(self):
+        self.assertEqual(linkcheck_helper.resolve_url(page, " HTTP://QED.example.gov:80/a#f "),
+                         "http://qed.example.gov/a")
+
+    def test_non_http_schemes_dropped(self):
+        for href in ("mailto:qed@example.gov", "javascript:void(0)", "ftp://example.gov/x", "tel:5551234"):
+            self.assertIsNone(linkcheck_helper.resolve_url(page, href), href)
+
+    def test_malformed_links_kept(self):
+        self.assertEqual(linkcheck_helper.resolve_url(page, "http://[bad"), "http://[bad")
+        self.assertEqual(linkcheck_helper.resolve_url(page, "https://[bad/x"), "https://[bad/x")
+        self.assertEqual(linkcheck_helper.fetch_status("http://[bad", 1), 999)
+
+    def test_build_http_links(self):
+        links = [{"href": "sip"}, {"href": "sip#top"}, {}, {"href": "mailto:qed@example.gov"},
+                 {"href": "http://[bad"}]
+        self.assertEqual(linkcheck_helper.build_http_links("http://qed.example.gov", links),
+                         ["http://qed.example.gov/ubertool/sip", "No link available", "http://[bad"])
+
+    def test_base_href(self):
+        # a page's <base href> (PageLinks.base) is used as given, not as a server root
+        self.assertEqual(linkcheck_helper.build_http_links("http://qed.example.gov/static/", [{"href": "a.pdf"}]),
+                         ["http://qed.example.gov/static/a.pdf"])
@@ -0,0 +1,63 @@
+import requests
+import unittest
+from . import page_helper
+from . import stub_server
+
+#offline checks of the region link parser, and of extract_links against the local stub server
+
+regions = {"banner": ("id", "banner"), "articles": ("class", "articles")}
+
+
+class TestRegionLinkParser(unittest.TestCase):
+    """
+    parse_links / RegionLinkParser: links are kept only within the first div of each region
+    """
+
+    def test_regions(self):
+        html = ('<html><head><base href="http://qed.example.gov/static/"></head><body>'
+                '<a href="outside">x</a><div id="banner"><div><a href="nested">n</a></div><a href="b1">b</a></div>'
+                '<a href="after">x</a><div class="page articles"><a href="a1"/><br/><a href="a2">2</a></div>'
+                '<div class="articles"><a href="second">ignored</a></div></body></html>')
+        parser = page_helper.RegionLinkParser(regions)
+        parser.feed(html)
+        self.assertEqual([link["href"] for link in parser.links["banner"]], ["nested", "b1"])
+        self.assertEqual([link["href"] for link in parser.links["articles"]], ["a1", "a2"])
+        self.assertEqual(parser.base, "http://qed.example.gov/static/")
+        self.assertTrue(parser.complete)
+
+    def test_chunks(self):
+        # a tag split across parser feeds is still seen; reading stops once every region closed
+        html = '<div id="banner"><a href="b1">b</a></div><div class="articles"><a href="a1">a</a></div>' + \
+               '<a href="filler">f</a>' * 1000
+        links = page_helper.parse_links(html, regions, size=7)
+        self.assertEqual([link["href"] for link in links["banner"]], ["b1"])
+        self.assertEqual([link["href"] for link in links["articles"]], ["a1"])
+
+    def test_missing_region(self):
+        links = page_helper.parse_links('<div id="other"><a href="x">x</a></div>', regions)
+        self.assertEqual(links, {"banner": [], "articles": []})
+
+
+class TestExtractLinks(unittest.TestCase):
+    """
+    extract_links / cached_links against the stub server
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = stub_server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_error_status_raises(self):
+        # an error page is not parsed (or cached) as a page without links
+        for attempt in range(2):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                page_helper.cached_links(self.base + "/status/500", regions)
+
+    def test_page_without_region(self):
+        page_links = page_helper.extract_links(self.base + "/site", {"content": ("id", "content")})
+        self.assertEqual(page_links["content"], [])
+        self.assertEqual(page_links.base, self.base + "/site")
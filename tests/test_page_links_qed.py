@@ -1,14 +1,21 @@
-import requests
-from bs4 import BeautifulSoup
 import numpy.testing as npt
+import requests
 import unittest
 from tabulate import tabulate
 from . import linkcheck_helper
+from . import page_helper
+from . import ratelimit_helper
+from . import session_helper
+from . import sink_helper
+from . import targets_helper
+from . import timing_helper
 
 #this routine scans the main ubertool page for url links and verifies that they respond
 #these links are repeated (as a template of sorts) on all model pages; but tested here only
+#each server's main page is fetched and parsed once (page_helper.cached_links) and its
+#region links are shared by all of the tests below; the main pages are the targets_helper
+#suite "main"
 
-servers = ["http://qedinternal.epa.gov"]
 
 class TestPageLinks(unittest.TestCase):
     """
@@ -24,6 +31,13 @@ class TestPageLinks(unittest.TestCase):
     def teardown(self):
         pass
 
+    @classmethod
+    def tearDownClass(cls):
+        session_helper.report_connections()
+        session_helper.report_transfer()
+        ratelimit_helper.report()
+        timing_helper.report("server")
+
     @staticmethod
     def test_qed_bannerlinks():
         test_name = "Test of Ubertool Mainpage Banner Links "
@@ -31,18 +45,21 @@ class TestPageLinks(unittest.TestCase):
         link_url = ""
         status = ""
         try:  # verify that all links on a model page produce status code of 200
-            for main_server in servers:
-                response = requests.get(main_server + "/ubertool")
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tags_banner = soup_content.find_all('div', {'id': 'banner'})
-                # assuming a single div/id by this name
-                banner_links = div_tags_banner[0].find_all('a')
+            for target in targets_helper.targets("main", **targets_helper.env_filters()):
+                try:
+                    page_links = page_helper.cached_links(target.url)  # fetched once per session
+                except requests.exceptions.HTTPError as e:  # the main page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [target.url], [e.response.status_code])
+                    continue
+                # links within the first div/id by this name
+                banner_links = page_links['banner']
                 if banner_links:
                     assert_error = False
                     link_url = [""] * len(banner_links)
                     status = [""] * len(banner_links)
-                    link_url = linkcheck_helper.build_http_links(main_server, banner_links)
-                    status = linkcheck_helper.status_chk(link_url)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, banner_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
                     try:
                         npt.assert_array_equal(status, 200, '200 error', True)
                     except AssertionError:
@@ -54,7 +71,7 @@ class TestPageLinks(unittest.TestCase):
             # handle any other exception
             print("Error '{0}' occurred. Arguments {1}.".format(e, e.args))
         finally:
-             linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+             linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         return
 
     @staticmethod
@@ -64,18 +81,21 @@ class TestPageLinks(unittest.TestCase):
         link_url = ""
         status = ""
         try:  # verify that all links on a model page produce status code of 200
-            for main_server in servers:
-                response = requests.get(main_server + "/ubertool")
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tags_header_rgt = soup_content.find_all('div', {'id': 'header_menu_r'})
-                # assuming a single div/id by this name
-                header_links = div_tags_header_rgt[0].find_all('a')
+            for target in targets_helper.targets("main", **targets_helper.env_filters()):
+                try:
+                    page_links = page_helper.cached_links(target.url)  # fetched once per session
+                except requests.exceptions.HTTPError as e:  # the main page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [target.url], [e.response.status_code])
+                    continue
+                # links within the first div/id by this name
+                header_links = page_links['header_menu_r']
                 if header_links:
                     assert_error = False
                     link_url = [""] * len(header_links)
                     status = [""] * len(header_links)
-                    link_url = linkcheck_helper.build_http_links(main_server, header_links)
-                    status = linkcheck_helper.status_chk(link_url)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, header_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
                     try:
                         npt.assert_array_equal(status, 200, '200 error', True)
                     except AssertionError:
@@ -87,7 +107,7 @@ class TestPageLinks(unittest.TestCase):
             # handle any other exception
             print("Error '{}' occurred. Arguments {}.".format(e, e.args))
         finally:
-            linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+            linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         return
 
     @staticmethod
@@ -97,18 +117,21 @@ class TestPageLinks(unittest.TestCase):
         link_url = ""
         status = ""
         try:  # verify that all links on a model page produce status code of 200
-            for main_server in servers:
-                response = requests.get(main_server + "/ubertool")
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tags_left = soup_content.find_all('div', {'class': 'left'})
-                # assuming a single div/class by this name
-                left_links = div_tags_left[0].find_all('a')
+            for target in targets_helper.targets("main", **targets_helper.env_filters()):
+                try:
+                    page_links = page_helper.cached_links(target.url)  # fetched once per session
+                except requests.exceptions.HTTPError as e:  # the main page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [target.url], [e.response.status_code])
+                    continue
+                # links within the first div/class by this name
+                left_links = page_links['left']
                 if left_links:
                     assert_error = False
                     link_url = [""] * len(left_links)
                     status = [""] * len(left_links)
-                    link_url = linkcheck_helper.build_http_links(main_server, left_links)
-                    status = linkcheck_helper.status_chk(link_url)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, left_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
                     try:
                         npt.assert_array_equal(status, 200, '200 error', True)
                     except AssertionError:
@@ -120,7 +143,7 @@ class TestPageLinks(unittest.TestCase):
             # handle any other exception
             print("Error '{}' occurred. Arguments {}.".format(e, e.args))
         finally:
-            linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+            linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         return
 
     @staticmethod
@@ -130,18 +153,21 @@ class TestPageLinks(unittest.TestCase):
         link_url = ""
         status = ""
         try:  # verify that all links on a model page (main article section) produce status code of 200
-            for main_server in servers:
-                response = requests.get(main_server + "/ubertool")
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tags_article = soup_content.find_all('div', {'class': 'articles'})
-                # assuming a single div/class by this name
-                article_links = div_tags_article[0].find_all('a')
+            for target in targets_helper.targets("main", **targets_helper.env_filters()):
+                try:
+                    page_links = page_helper.cached_links(target.url)  # fetched once per session
+                except requests.exceptions.HTTPError as e:  # the main page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [target.url], [e.response.status_code])
+                    continue
+                # links within the first div/class by this name
+                article_links = page_links['articles']
                 if article_links:
                     assert_error = False
                     link_url = [""] * len(article_links)
                     status = [""] * len(article_links)
-                    link_url = linkcheck_helper.build_http_links(main_server, article_links)
-                    status = linkcheck_helper.status_chk(link_url)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, article_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
                     try:
                         npt.assert_array_equal(status, 200, '200 error', True)
                     except AssertionError:
@@ -153,7 +179,7 @@ class TestPageLinks(unittest.TestCase):
             # handle any other exception
             print("Error '{}' occurred. Arguments {}.".format(e, e.args))
         finally:
-            linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+            linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         return
 
     @staticmethod
@@ -163,17 +189,20 @@ class TestPageLinks(unittest.TestCase):
         link_url = ""
         status = ""
         try:  # verify that all links on a model page produce status code of 200
-            for main_server in servers:
-                response = requests.get(main_server + "/ubertool")
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tags_right = soup_content.find_all('div', {'class': 'right'})
-                # assuming a single div/class by this name
-                right_links = div_tags_right[0].find_all('a')
+            for target in targets_helper.targets("main", **targets_helper.env_filters()):
+                try:
+                    page_links = page_helper.cached_links(target.url)  # fetched once per session
+                except requests.exceptions.HTTPError as e:  # the main page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [target.url], [e.response.status_code])
+                    continue
+                # links within the first div/class by this name
+                right_links = page_links['right']
                 if right_links:
                     link_url = [""] * len(right_links)
                     status = [""] * len(right_links)
-                    link_url = linkcheck_helper.build_http_links(main_server, right_links)
-                    status = linkcheck_helper.status_chk(link_url)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, right_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
                     try:
                         npt.assert_array_equal(status, 200, '200 error', True)
                     except AssertionError:
@@ -185,7 +214,7 @@ class TestPageLinks(unittest.TestCase):
             # handle any other exception
             print("Error '{}' occurred. Arguments {}.".format(e, e.args))
         finally:
-            linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+            linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         return
 
 if __name__ == '__main__':
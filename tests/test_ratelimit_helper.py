@@ -0,0 +1,96 @@
+import time
+import requests
+import unittest
+from . import ratelimit_helper
+from . import session_helper
+from . import stub_server
+
+#offline checks of the per-host circuit breaker (no network needed)
+
+
+def response(code):
+    result = requests.Response()
+    result.status_code = code
+    return result
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    HostLimiter opens after failure_threshold failed requests, refuses requests while
+    open, then lets one trial request decide whether it closes
+    """
+
+    def open_limiter(self):
+        limiter = ratelimit_helper.HostLimiter("http://qed.example.gov", rate=1000, burst=1000)
+        for _ in range(ratelimit_helper.failure_threshold):
+            limiter.acquire()
+            limiter.failed()
+        return limiter
+
+    def test_opens_after_threshold(self):
+        limiter = ratelimit_helper.HostLimiter("http://qed.example.gov", rate=1000, burst=1000)
+        for _ in range(ratelimit_helper.failure_threshold - 1):
+            limiter.failed()
+        self.assertEqual(limiter.state(), "closed")
+        limiter.failed()
+        self.assertEqual(limiter.state(), "open")
+        self.assertRaises(ratelimit_helper.HostDown, limiter.acquire)
+        self.assertEqual(limiter.stats["refused"], 1)
+
+    def test_opened_counted_once(self):
+        # requests in flight when the circuit opens fail too, without opening it again
+        limiter = self.open_limiter()
+        limiter.failed()
+        self.assertEqual(limiter.stats["opened"], 1)
+
+    def test_trial_closes(self):
+        limiter = self.open_limiter()
+        limiter.open_until = time.monotonic()
+        self.assertTrue(limiter.acquire())  # the trial request
+        self.assertEqual(limiter.state(), "half open")
+        self.assertRaises(ratelimit_helper.HostDown, limiter.acquire)  # one trial at a time
+        limiter.succeeded(response(200))
+        self.assertEqual(limiter.state(), "closed")
+        self.assertFalse(limiter.acquire())
+
+    def test_failed_trial_reopens(self):
+        limiter = self.open_limiter()
+        limiter.open_until = time.monotonic()
+        limiter.acquire()
+        limiter.failed()
+        self.assertEqual(limiter.state(), "open")
+        self.assertFalse(limiter.trial)
+
+    def test_backoff_status(self):
+        limiter = ratelimit_helper.HostLimiter("http://qed.example.gov", rate=10, burst=10)
+        limiter.succeeded(response(429), pause=5)
+        self.assertEqual(limiter.rate, 10 * ratelimit_helper.backoff_multiplier)
+        self.assertGreater(limiter.paused_until, time.monotonic() + 4)
+
+
+class TestLimitedAdapter(unittest.TestCase):
+    """
+    the limited session against the stub server: 429s are retried after the host's pause,
+    and a host that refuses connections is reported down
+    """
+
+    def test_busy_retried(self):
+        server, base = stub_server.start()
+        saved = ratelimit_helper.throttle_pause
+        ratelimit_helper.throttle_pause = 0.1
+        try:
+            result = session_helper.build_session().get(base + "/busy/1/retried", timeout=5)
+        finally:
+            ratelimit_helper.throttle_pause = saved
+            server.shutdown()
+        self.assertEqual(result.status_code, 200)
+
+    def test_dead_host(self):
+        server, base = stub_server.start()
+        server.shutdown()
+        server.server_close()  # nothing listens on the port now
+        session = session_helper.build_session(retries=0)
+        for _ in range(ratelimit_helper.failure_threshold):
+            self.assertRaises(requests.exceptions.ConnectionError, session.get, base + "/fast", timeout=2)
+        self.assertRaises(ratelimit_helper.HostDown, session.get, base + "/fast", timeout=2)
+        self.assertEqual(ratelimit_helper.limiter_for(base).state(), "open")
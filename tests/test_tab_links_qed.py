@@ -1,18 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
 import numpy.testing as npt
+import requests
 import unittest
 from tabulate import tabulate
 from . import linkcheck_helper
+from . import page_helper
+from . import ratelimit_helper
+from . import session_helper
+from . import sink_helper
+from . import targets_helper
+from . import timing_helper
 
-main_server = ["http://qed.epa.gov/ubertool/", "http://qedinternal.epa.gov/ubertool/"]
-models = ["sip/", "stir/", "rice/", "terrplant/",  "iec/",
-          "agdrift/", "agdrift_trex/", "agdrift_therps/", "earthworm/",
-          "kabam/", "pfam/", "sam/", "therps/", "trex2/"]
-#models = ["sip/", "stir/", "pfam/", "earthworm/"]
-pages = ["descriptions","references"]
-
-model_tab_pages = [s + m + p for s in main_server for m in models for p in pages]
+#model description and reference tabs on the ubertool servers (targets_helper suite "tabs")
 
 class TestTabLinks(unittest.TestCase):
     """
@@ -27,32 +25,42 @@ class TestTabLinks(unittest.TestCase):
     def teardown(self):
         pass
 
+    @classmethod
+    def tearDownClass(cls):
+        session_helper.report_connections()
+        session_helper.report_transfer()
+        ratelimit_helper.report()
+        timing_helper.report("server")
+
     @staticmethod
     def test_qed_mainpagelinks():
         try:  # verify that all links on a model page (main article section) produce status code of 200
             test_name = "Model Mainpage Article Links "
-            for page in model_tab_pages:
-                response = requests.get(page)
-                soup_content = BeautifulSoup(response.content, "html.parser")
-                div_tag_article = soup_content.find_all('div', {'class': 'articles'})
-                # assuming a single div/class by this name
-                if div_tag_article:
-                    article_links = div_tag_article[0].find_all('a')
-                    if article_links:
-                        assert_error = False
-                        link_url = [""] * len(article_links)
-                        status = [""] * len(article_links)
-                        link_url = linkcheck_helper.build_http_links(page, article_links)
-                        status = linkcheck_helper.status_chk(link_url)
-                        try:
-                            npt.assert_array_equal(status, 200, '200 error', True)
-                        except AssertionError:
-                            assert_error = True
-                        except Exception as e:
-                            # handle any other exception
-                            print("Error '{}' occurred. Arguments {}.".format(e, e.args))
-                        finally:
-                            linkcheck_helper.write_report(test_name, assert_error, link_url, status)
+            for target in targets_helper.targets("tabs", **targets_helper.env_filters()):
+                page = target.url
+                # links within the first div/class by this name (reading stops at its end)
+                try:
+                    page_links = page_helper.extract_links(page, {'articles': ('class', 'articles')})
+                except requests.exceptions.HTTPError as e:  # the tab page itself is failing
+                    assert_error = True
+                    linkcheck_helper.write_report(test_name, True, [page], [e.response.status_code])
+                    continue
+                article_links = page_links['articles']
+                if article_links:
+                    assert_error = False
+                    link_url = [""] * len(article_links)
+                    status = [""] * len(article_links)
+                    link_url = linkcheck_helper.build_http_links(page_links.base, article_links)
+                    status = linkcheck_helper.status_chk(link_url, on_result=sink_helper.recorder(test_name, 200))
+                    try:
+                        npt.assert_array_equal(status, 200, '200 error', True)
+                    except AssertionError:
+                        assert_error = True
+                    except Exception as e:
+                        # handle any other exception
+                        print("Error '{}' occurred. Arguments {}.".format(e, e.args))
+                    finally:
+                        linkcheck_helper.write_report(test_name, assert_error, link_url, status, streamed=True)
         except Exception as e:
             # handle any other exception
             print("Error '{}' occurred. Arguments {}.".format(e, e.args))
@@ -1,14 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
 import unittest
 import numpy.testing as npt
 import unicodedata
 from selenium import webdriver
 # from selenium.webdriver.support.ui import WebDriverWait
 import os
-import time
 from tabulate import tabulate
-import linkcheck_helper
+from . import auth_helper
+from . import browser_helper
+from . import httpcheck_helper
+from . import linkcheck_helper
+from . import targets_helper
+from . import wait_helper
 
 phantomjs_path = "C://Python27//Lib//site-packages//selenium//webdriver//phantomjs//phantomjs-2.1.1-windows//bin//phantomjs.exe"
 
@@ -25,61 +27,32 @@ phantomjs_path = "C://Python27//Lib//site-packages//selenium//webdriver//phantom
 
 test = {}
 
-# local server = ["http://127.0.0.1:8000/"]
-servers = ["http://qed.epa.gov/ubertool/", "http://qedinternal.epa.gov/ubertool/",
-           "http://134.67.114.3/ubertool/", "http://134.67.114.1/ubertool/"]
+# the pages checked are the targets_helper suites "input" (input pages of the two servers
+# that redirect to the login form) and "qaqc", with the short model list used for debugging;
+# each target carries its url and the model's page title (e.g., "SIP")
 
-#models = ["sip/", "stir/", "rice/", "terrplant/",  "iec/",
-#          "agdrift/", "agdrift_trex/", "agdrift_therps/", "earthworm/",
-#          "kabam/", "pfam/", "sam/", "therps/", "trex2/"]
-models = ["sip/", "stir/", "pfam/", "earthworm/"] # this short list is used for debugging
 
-# The following list represents the model output page titles to be checked (order of models
-# needs to be the same as "models" list above
-#models_io = ["SIP", "STIR", "RICE", "TerrPlant", "IEC",
-#             "AgDrift", "AgDrift & T-REX", "AgDrift & T-HERPS", "Earthworm",
-#             "KABAM", "PFAM", "SAM", "T-Herps", "T-REX 1.5.2"]
-models_io = ["SIP", "STIR", "PFAM", "Earthworm"] # this short list is used for debugging
+def make_browser():
+    # added the argument service_log_path=os.path.devnull to the function webdriver.PhantomJS()
+    # to prevent PhantomJS from creating a ghostdriver.log in the directory of the python file
+    # being executed.
+    return webdriver.PhantomJS(executable_path=phantomjs_path, service_log_path=os.path.devnull)
 
-# these two servers require login/authentication for inputs
-redirect_servers = ["http://qed.epa.gov/ubertool/", "http://134.67.114.3/ubertool/"]
-redirect_pages = ["input"]  # user is redirected to login page for inputs
-redirect_model_pages = [s + m + p for s in redirect_servers for m in models
-                        for p in redirect_pages]
-redirect_models = models_io * len(redirect_servers)
+#warm browsers shared by all of the TestQAQC checks (started on first use, quit at teardown)
+browser_pool_size = 4
+browsers = browser_helper.BrowserPool(make_browser, browser_pool_size)
+#logged-in http sessions for the output and QAQC checks, which need the browser only for
+#pages whose form or run button is driven by javascript (see httpcheck_helper)
+http_browsers = auth_helper.AuthenticatedBrowsers("betatester", "ubertool")
 
-qaqc_pages = ["qaqc"]
-qaqc_model_pages = [s + m + p for s in servers for m in models for p in qaqc_pages]
-qaqc_models = models_io * len(servers) * len(qaqc_pages)
-
-class WaitForPageLoad(object):
+class WaitForPageLoad(wait_helper.PageLoadWaiter):
     """
     This class provides functionality to ensure that a web page has
-    fully loaded upon a click/submit
+    fully loaded upon a click/submit (navigation away from the current page,
+    then the browser's load event, within a timeout adapted to the page's
+    load history; see wait_helper)
     """
-
-    def __init__(self, browser):
-        self.browser = browser
-
-    def __enter__(self):
-        self.old_page = self.browser.find_element_by_tag_name('html')
-
-    def page_has_loaded(self):
-        new_page = self.browser.find_element_by_tag_name('html')
-        return new_page.id != self.old_page.id
-
-    def wait_for(self, condition_function):
-        start_time = time.time()
-        while time.time() < start_time + 3:
-            if condition_function():
-                return True
-            else:
-                time.sleep(0.1)
-        raise Exception(
-            'Timeout waiting for {}'.format(condition_function.__name__))
-
-    def __exit__(self, *_):
-        self.wait_for(self.page_has_loaded)
+    pass
 
 
 class TestQAQC(unittest.TestCase, WaitForPageLoad):
@@ -94,186 +67,204 @@ class TestQAQC(unittest.TestCase, WaitForPageLoad):
     Note: the first three tests here are also included in the "test_host_qed.py"
           code; the difference being that the selenium package is used here and
           the mechanize package is used in test_host_qed.py code
+    Browsers come from a shared pool (browsers) of warm instances, and the pages of each
+    test are checked in parallel, one page per pooled browser at a time; the output and
+    QAQC checks are made over http, falling back to a browser only where javascript is needed
     """
 
     def setup(self):
         pass
 
+    @classmethod
+    def tearDownClass(cls):
+        httpcheck_helper.report()
+        browsers.report()
+        wait_helper.history.report()
+        browsers.close()
+        http_browsers.close()
+
+    @staticmethod
+    def login(browser, m):
+        browser.get(m)
+        # login and authenticate
+        username = browser.find_element_by_name("username")
+        username.send_keys("betatester")
+        password = browser.find_element_by_name("password")
+        password.send_keys("ubertool")
+        with WaitForPageLoad(browser):
+            login = browser.find_element_by_xpath("//form[@name='auth']")
+            login.submit()  # use .click() for individual buttons and .submit() for form submittal
+                #alternative technique
+                #LoginButton = browser.find_element_by_class_name("input_button")
+                #LoginButton.click()
+        return
+
+    @staticmethod
+    def check_authenticate(browser, item):
+        m = item.url
+        TestQAQC.login(browser, m)
+        # Verify we have successfully logged in and are now at input page url
+        return str(browser.current_url)
+
+    @staticmethod
+    def check_input_form(browser, item):
+        m, title = item.url, item.title
+        TestQAQC.login(browser, m)
+        # verify that login was successful by checking that inputs page title is rendered
+        if browser.page_source.__contains__(title + " Inputs"):
+            return m + " : " + title + " Inputs"
+        return m + " : " + title + " Input Submit Error"
+
+    @staticmethod
+    def output_result(title, current_url, page_source):
+        if page_source.__contains__("User Inputs"):
+            return current_url.replace("output", "") + " : " + title + " Output"
+        elif page_source.__contains__('File Not Found'):
+            return current_url.replace("output", "") + " : File Not Found Page Error"
+        return current_url.replace("output", "") + " : Unknown Output Page Error"
+
+    @staticmethod
+    def check_output_form(browser, item):
+        m, title = item.url, item.title
+        TestQAQC.login(browser, m)
+        # Locate and submit input form (using the default data for now)
+        with WaitForPageLoad(browser):
+            try:
+                form_submit = browser.find_element_by_xpath("//button[@class='input_button']")
+            except:
+                form_submit = browser.find_element_by_xpath("//button[@class='submit input_button']")
+            form_submit.submit()  # use .click() for individual buttons and .submit() for form submittal
+        return TestQAQC.output_result(title, browser.current_url, browser.page_source)
+
+    @staticmethod
+    def http_output_form(item):
+        # check_output_form without a browser; None if the input form needs javascript
+        m, title = item.url, item.title
+        response = http_browsers.follow(m, httpcheck_helper.click_step("button.input_button"))
+        if response is None:
+            return None
+        return TestQAQC.output_result(title, response.url, response.text)
+
+    @staticmethod
+    def qaqc_result(title, m, current_url, page_source):
+        if current_url != m + "/run":
+            return current_url + " : Run QAQC failed"  # we did not arrive at expected url
+        elif page_source.__contains__('File Not Found'):
+            return current_url + " : File Not Found Page Error"
+        elif page_source.__contains__("User Inputs"):
+            # check to see of string User Inputs appears on page
+            return m + "/run : " + title + " QAQC"
+        return current_url + " Unknown QAQC run error"
+
+    @staticmethod
+    def check_qaqc(browser, item):
+        m, title = item.url, item.title
+        browser.get(m)
+        try:
+            with WaitForPageLoad(browser):
+                qaqc_run_button = browser.find_element_by_id('runQAQC')
+                qaqc_run_button.click()
+            return TestQAQC.qaqc_result(title, m, str(browser.current_url), browser.page_source)
+        except:
+            return m + " Unknown exception thrown"
+
+    @staticmethod
+    def http_qaqc(item):
+        # check_qaqc without a browser; None if the run button's request is built by javascript
+        m, title = item.url, item.title
+        try:
+            response = http_browsers.follow(m, httpcheck_helper.click_step("#runQAQC"))
+        except Exception:
+            return m + " Unknown exception thrown"
+        if response is None:
+            return None
+        return TestQAQC.qaqc_result(title, m, response.url, response.text)
+
     @staticmethod
     def test_qed_authenticate_input():
+        test_name = "Login Authentication "
+        input_targets = list(targets_helper.targets("input", **targets_helper.env_filters()))
+        current_page = [""] * len(input_targets)
+        expected_page = [target.url for target in input_targets]
+        assert_error = False
         try:  # verify successful login and that we land on input page url
-            test_name = "Login Authentication "
-            current_page = [""] * len(redirect_model_pages)
-            expected_page = [""] * len(redirect_model_pages)
-            assert_error = False
-            for idx, m in enumerate(redirect_model_pages):
-                browser = webdriver.PhantomJS(executable_path=phantomjs_path, service_log_path=os.path.devnull)
-                browser.get(m)
-                # login and authenticate
-                username = browser.find_element_by_name("username")
-                username.send_keys("betatester")
-                password = browser.find_element_by_name("password")
-                password.send_keys("ubertool")
-                with WaitForPageLoad(browser):
-                    login = browser.find_element_by_xpath("//form[@name='auth']")
-                    login.submit()  # use .click() for individual buttons and .submit() for form submittal
-                        #next two lines is alternative technique
-                        #LoginButton = browser.find_element_by_class_name("input_button")
-                        #LoginButton.click()
-                # Verify we have successfully logged in and are now at input page url
-                current_page[idx] = str(browser.current_url)
-                expected_page[idx] = m
+            current_page = browsers.run(TestQAQC.check_authenticate, input_targets)
             try:
                 npt.assert_array_equal(expected_page, current_page, 'Login Test Failed', True)
             except AssertionError:
                 assert_error = True
-            except Exception as e:
-                # handle any other exception
-                print("Error '{0}' occured. Arguments {1}.".format(e.message, e.args))
         except Exception as e:
             # handle any other exception
-            print("Error '{0}' occured. Arguments {1}.".format(e.message, e.args))
+            print("Error '{0}' occured. Arguments {1}.".format(e, e.args))
         finally:
             linkcheck_helper.write_report(test_name, assert_error, expected_page, current_page)
-            browser.quit()
         return
 
     @staticmethod
     def test_qed_input_form():
         # verify input page contains expected content (we chk page title, e.g., 'SIP Inputs')
         # need to repeat login
+        test_name = "Input Form URL "
+        input_targets = list(targets_helper.targets("input", **targets_helper.env_filters()))
+        current_title = [""] * len(input_targets)
+        expected_title = [target.url + " : " + target.title + " Inputs" for target in input_targets]
+        assert_error = False
         try:
-            test_name = "Input Form URL "
-            current_title = [""] * len(redirect_model_pages)
-            expected_title = [""] * len(redirect_model_pages)
-            assert_error = False
-            for idx, m in enumerate(redirect_model_pages):
-                expected_title[idx] = m + " : " + redirect_models[idx] + " Inputs"
-                browser = webdriver.PhantomJS(executable_path=phantomjs_path, service_log_path=os.path.devnull)
-                browser.get(m)
-                # login and authenticate
-                username = browser.find_element_by_name("username")
-                username.send_keys("betatester")
-                password = browser.find_element_by_name("password")
-                password.send_keys("ubertool")
-                with WaitForPageLoad(browser):
-                    login = browser.find_element_by_xpath("//form[@name='auth']")
-                    login.submit()  # use .click() for individual buttons and .submit() for form submittal
-                # verify that login was successful by checking that inputs page title is rendered
-                if browser.page_source.__contains__(redirect_models[idx] + " Inputs"):
-                    current_title[idx] = m + " : " + redirect_models[idx] + " Inputs"
-                else:
-                    current_title[idx] = m + " : " + redirect_models[idx] + " Input Submit Error"
-                # build array for reporting table
+            current_title = browsers.run(TestQAQC.check_input_form, input_targets)
             try:
                 npt.assert_array_equal(expected_title, current_title, 'Input Form Submittal Failed', True)
             except AssertionError:
                 assert_error = True
-            except Exception as e:
-                # handle any other exception
-                print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
         except Exception as e:
             # handle any other exception
-            print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
+            print("Error '{0}' occured. Arguments {1}.".format(e, e.args))
         finally:
             linkcheck_helper.write_report(test_name, assert_error, expected_title, current_title)
-            browser.quit()
         return
 
     @staticmethod
     def test_qed_output_form():
-        try:  # verify proper output page content, i.e., page title
-              # need to repeat login, submit default inputs
-            test_name = "Input Form Submittal and Output Generation "
-            current_title = [""] * len(redirect_model_pages)
-            expected_title = [""] * len(redirect_model_pages)
-            assert_error = False
-            for idx, m in enumerate(redirect_model_pages):
-                expected_title[idx] = m.replace("input", "") + " : " + redirect_models[idx] + " Output"
-                browser = webdriver.PhantomJS(executable_path=phantomjs_path, service_log_path=os.path.devnull)
-                browser.get(m)
-                # login and authenticate
-                username = browser.find_element_by_name("username")
-                username.send_keys("betatester")
-                password = browser.find_element_by_name("password")
-                password.send_keys("ubertool")
-                with WaitForPageLoad(browser):
-                    login = browser.find_element_by_xpath("//form[@name='auth']")
-                    login.submit()  # use .click() for individual buttons and .submit() for form submittal
-                # Locate and submit input form (using the default data for now)
-                with WaitForPageLoad(browser):
-                    locate_submit = browser.find_element_by_xpath("//div[@class='input_right']")
-                    try:
-                        form_submit = browser.find_element_by_xpath("//button[@class='input_button']")
-                    except:
-                        form_submit = browser.find_element_by_xpath("//button[@class='submit input_button']")
-                    form_submit.submit()  # use .click() for individual buttons and .submit() for form submittal
-                if browser.page_source.__contains__("User Inputs"):
-                    current_title[idx] = browser.current_url.replace("output", "") + " : " + redirect_models[
-                        idx] + " Output"
-                elif browser.page_source.__contains__('File Not Found'):
-                    current_title[idx] = browser.current_url.replace("output", "") + " : File Not Found Page Error"
-                else:
-                    current_title[idx] = browser.current_url.replace("output", "") + " : Unknown Output Page Error"
+        # verify proper output page content, i.e., page title
+        # need to repeat login, submit default inputs
+        test_name = "Input Form Submittal and Output Generation "
+        input_targets = list(targets_helper.targets("input", **targets_helper.env_filters()))
+        current_title = [""] * len(input_targets)
+        expected_title = [target.url.replace("input", "") + " : " + target.title + " Output"
+                          for target in input_targets]
+        assert_error = False
+        try:
+            current_title = httpcheck_helper.run_checks(TestQAQC.http_output_form, TestQAQC.check_output_form,
+                                                         input_targets, browsers)
             try:
                 npt.assert_array_equal(expected_title, current_title, 'Submittal of Input Failed', True)
             except AssertionError:
                 assert_error = True
-            except Exception as e:
-                # handle any other exception
-                print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
         except Exception as e:
             # handle any other exception
-            print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
+            print("Error '{0}' occured. Arguments {1}.".format(e, e.args))
         finally:
             linkcheck_helper.write_report(test_name, assert_error, expected_title, current_title)
-            browser.quit()
         return
 
     @staticmethod
     def test_qed_qaqc_form():
+        test_name = "QAQC Execution and Results Generation "
+        qaqc_targets = list(targets_helper.targets("qaqc", **targets_helper.env_filters()))
+        current_page_id = [""] * len(qaqc_targets)  # pageID = url + <h2 class='model header' string>
+        expected_page_id = [target.url + "/run : " + target.title + " QAQC" for target in qaqc_targets]
+        assert_error = False
         try:
-            test_name = "QAQC Execution and Results Generation "
-            current_page_id = [""] * len(qaqc_model_pages)  # pageID = url + <h2 class='model header' string>
-            expected_page_id = [""] * len(qaqc_model_pages)
-            assert_error = False
-            browser = webdriver.PhantomJS(executable_path=phantomjs_path, service_log_path=os.path.devnull)
-            # added the argument service_log_path=os.path.devnull to the function webdriver.PhantomJS()
-            # to prevent PhantomJS from creating a ghostdriver.log in the directory of the python file
-            # being executed.
-            for idx, m in enumerate(qaqc_model_pages):
-                expected_page_id[idx] = m + "/run : " + qaqc_models[idx] + " QAQC"
-                browser.get(m)
-                try:
-                    with WaitForPageLoad(browser):
-                        qaqc_run_button = browser.find_element_by_id('runQAQC')
-                        qaqc_run_button.click()
-                    if browser.current_url.__str__() != m + "/run":
-                        current_page_id[idx] = str(
-                            browser.current_url) + " : Run QAQC failed"  # we did not arrive at expected url
-                    elif browser.page_source.__contains__('File Not Found'):
-                        current_page_id[idx] = str(browser.current_url) + " : File Not Found Page Error"
-                    elif browser.page_source.__contains__("User Inputs"):
-                        # check to see of string User Inputs appears on page
-                        current_page_id[idx] = m + "/run : " + qaqc_models[idx] + " QAQC"
-                    else:
-                        current_page_id[idx] = str(browser.current_url) + " Unknown QAQC run error"
-                except:
-                    current_page_id[idx] = m + " Unknown exception thrown"
-                # build array for reporting table
+            current_page_id = httpcheck_helper.run_checks(TestQAQC.http_qaqc, TestQAQC.check_qaqc,
+                                                           qaqc_targets, browsers)
             try:
                 npt.assert_array_equal(expected_page_id, current_page_id, 'QAQC Failed', True)
             except AssertionError:
                 assert_error = True
-            except Exception as e:
-                # handle any other exception
-                print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
         except Exception as e:
             # handle any other exception
-            print "Error '{0}' occured. Arguments {1}.".format(e.message, e.args)
+            print("Error '{0}' occured. Arguments {1}.".format(e, e.args))
         finally:
             linkcheck_helper.write_report(test_name, assert_error, expected_page_id, current_page_id)
-            browser.quit()
         return
 
     def teardown(self):
@@ -0,0 +1,164 @@
+import socket
+import threading
+import time
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+from tabulate import tabulate
+from . import results_helper
+
+# per-request latency instrumentation: the http adapter built by session_helper uses the
+# timed connection classes below, which record dns, tcp connect and tls handshake time for
+# each new connection; session_helper adds time to first byte (headers received), total
+# time and response size, and every request is recorded here for the percentile tables.
+# phases are collected per thread, since a request runs entirely on its calling thread.
+# time a thread spends queued before sending (waiting for a rate limit token) is counted
+# separately (add_wait) and is not part of a request's latency
+
+_local = threading.local()
+_lock = threading.Lock()
+_records = []  # one dict per request: url, dns, connect, tls, ttfb, total, bytes
+phase_names = ("dns", "connect", "tls")
+
+
+def start():
+    # begins timing a request on this thread; returns its start time
+    _local.phases = dict((name, 0.0) for name in phase_names)
+    _local.wait_mark = waited()
+    return time.perf_counter()
+
+
+def add_wait(seconds):
+    # records time this thread spent queued rather than on a request (e.g., for a rate limit token)
+    _local.waited = waited() + seconds
+    return
+
+
+def waited():
+    # total seconds this thread has spent queued (add_wait); differences give a window's share
+    return getattr(_local, "waited", 0.0)
+
+
+def queued():
+    # seconds this thread has spent queued since start()
+    return waited() - getattr(_local, "wait_mark", waited())
+
+
+def phases():
+    # connection phase times recorded on this thread since start() (zero for a reused connection)
+    return dict(getattr(_local, "phases", None) or dict((name, 0.0) for name in phase_names))
+
+
+def _add_phase(name, seconds):
+    current = getattr(_local, "phases", None)
+    if current is not None:
+        current[name] += seconds
+    return
+
+
+class TimedConnectionMixin(object):
+    """
+    times name resolution and the tcp connect separately when a new socket is opened
+    """
+
+    def _new_conn(self):
+        # the lookup here only measures dns: the connection itself is left to urllib3, which
+        # resolves the host again (normally from the resolver's cache) and tries each address
+        start_time = time.perf_counter()
+        try:
+            socket.getaddrinfo(self._dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            pass  # the connect below raises its usual error
+        resolved_time = time.perf_counter()
+        sock = super(TimedConnectionMixin, self)._new_conn()
+        self.socket_seconds = time.perf_counter() - start_time
+        _add_phase("dns", resolved_time - start_time)
+        _add_phase("connect", self.socket_seconds - (resolved_time - start_time))
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        # the tls handshake is whatever connect() spends beyond opening the socket
+        self.socket_seconds = 0.0
+        start_time = time.perf_counter()
+        super(TimedHTTPSConnection, self).connect()
+        _add_phase("tls", max(time.perf_counter() - start_time - self.socket_seconds, 0.0))
+        return
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    requests adapter whose connection pools use the timed connection classes
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                   "https": TimedHTTPSConnectionPool}
+
+
+def record(url, start_time, request_phases, ttfb, size):
+    entry = {"url": url, "ttfb": ttfb, "total": time.perf_counter() - start_time, "bytes": size}
+    entry.update(request_phases)
+    with _lock:
+        _records.append(entry)
+    return entry
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def clear():
+    with _lock:
+        del _records[:]
+    return
+
+
+def percentile_rows(by="server", entries=None):
+    # one row per server or model: requests, p50/p95/p99 total seconds, mean ttfb and
+    # connection phases, mean bytes
+    if entries is None:
+        entries = records()
+    if not entries:
+        return []
+    position = {"server": 0, "model": 1, "page": 2}[by]
+    labels = np.array([results_helper.url_parts(entry["url"])[position] for entry in entries])
+    totals = np.array([entry["total"] for entry in entries])
+    columns = dict((name, np.array([entry[name] for entry in entries]))
+                   for name in ("ttfb", "bytes") + phase_names)
+    rows = []
+    for label in np.unique(labels):
+        mask = labels == label
+        p50, p95, p99 = np.percentile(totals[mask], [50, 95, 99])
+        rows.append([label, int(mask.sum()), round(p50, 3), round(p95, 3), round(p99, 3)] +
+                    [round(float(columns[name][mask].mean()), 3) for name in ("ttfb",) + phase_names] +
+                    [int(columns["bytes"][mask].mean())])
+    return rows
+
+
+def report(by="server"):
+    # prints the latency percentile table per server (or model)
+    rows = percentile_rows(by)
+    if rows:
+        headers = [by, "requests", "p50 s", "p95 s", "p99 s", "mean ttfb s", "mean dns s",
+                   "mean connect s", "mean tls s", "mean bytes"]
+        print(tabulate(rows, headers, tablefmt='grid'))
+    return
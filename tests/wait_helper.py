@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+import numpy as np
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+from tabulate import tabulate
+from . import results_helper
+
+# page-load waiting for the selenium checks (testing_ground): instead of polling for a new
+# <html> element every 0.1 s up to a fixed 3 s, a wait polls (every navigation_poll s) for
+# the old document to go stale (navigation) and then lets the browser signal readiness
+# itself (the 'load' event, or readyState already 'complete').  the timeout for each
+# (model, page) adapts to the load times seen so far, so slow model runs are not cut off
+# and hung pages fail sooner than a generous fixed cap would allow.  the report's "saved"
+# figure is an estimate, not a measurement: the old 0.1 s polling is not run alongside
+
+navigation_poll = 0.05  # s between staleness checks while the old document is still there
+default_timeout = 15  # s, until min_samples loads of a page have been seen
+min_timeout = 3  # s, never wait less than the old fixed cap
+max_timeout = 120  # s
+timeout_factor = 3  # timeout = timeout_factor * p95 load time + timeout_margin
+timeout_margin = 1
+min_samples = 5
+legacy_poll = 0.1  # s, the old polling interval, for the (estimated) saved time
+legacy_timeout = 3  # s, the old fixed cap
+
+# resolves (calls the webdriver callback) when the new document has finished loading
+ready_script = """
+var done = arguments[arguments.length - 1];
+if (document.readyState === 'complete') {
+    done(true);
+} else {
+    window.addEventListener('load', function () { done(true); });
+}
+"""
+
+
+class PageLoadHistory(object):
+    """
+    load times per (model, page), shared by all browsers; timeout() gives the adaptive
+    timeout for the next load of a page
+    """
+
+    def __init__(self):
+        self.loads = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self.loads.setdefault(key, []).append(seconds)
+        return
+
+    def timeout(self, key):
+        with self._lock:
+            seconds = list(self.loads.get(key, []))
+        if len(seconds) < min_samples:
+            return default_timeout
+        adaptive = timeout_factor * np.percentile(seconds, 95) + timeout_margin
+        return float(min(max(adaptive, min_timeout), max_timeout))
+
+    def clear(self):
+        with self._lock:
+            self.loads.clear()
+        return
+
+    def rows(self):
+        # per page: loads, mean/p95/max seconds, current timeout, an estimate of the time
+        # saved against 0.1 s polling and the loads that the old 3 s cap would have failed.
+        # the estimate rounds each measured load up to the old polling grid; it does not
+        # know when the old wait would really have returned, and the loads measured here
+        # already include this waiter's own staleness polling
+        with self._lock:
+            loads = dict((key, list(seconds)) for key, seconds in self.loads.items())
+        rows = []
+        for key in sorted(loads):
+            seconds = np.array(loads[key])
+            polled = np.array([math.ceil(s / legacy_poll - 1e-9) * legacy_poll for s in seconds])
+            rows.append(list(key) + [len(seconds), round(seconds.mean(), 3), round(np.percentile(seconds, 95), 3),
+                                     round(seconds.max(), 3), round(self.timeout(key), 1),
+                                     round(float((polled - seconds).sum()), 3),
+                                     int((seconds > legacy_timeout).sum())])
+        return rows
+
+    def report(self):
+        rows = self.rows()
+        if rows:
+            headers = ["model", "page", "loads", "mean s", "p95 s", "max s", "timeout s", "est. saved s",
+                       "over old cap"]
+            print(tabulate(rows, headers, tablefmt='grid'))
+            print("Estimated page-load wait saved: {:.2f}s against {}s polling (not measured)".format(
+                  sum(row[7] for row in rows), legacy_poll))
+        return
+
+
+history = PageLoadHistory()
+
+
+def page_key(url):
+    return results_helper.url_parts(url)[1:]
+
+
+class PageLoadWaiter(object):
+    """
+    context manager around a click/submit: on exit, waits for the browser to leave the
+    current page and for the new page to finish loading, within the adaptive timeout
+    """
+
+    def __init__(self, browser, key=None):
+        self.browser = browser
+        self.key = key
+
+    def __enter__(self):
+        self.old_page = self.browser.find_element_by_tag_name('html')
+        if self.key is None:
+            self.key = page_key(self.browser.current_url)
+        self.start_time = time.perf_counter()
+        return self
+
+    def wait_for_load(self):
+        timeout = history.timeout(self.key)
+        try:
+            WebDriverWait(self.browser, timeout, poll_frequency=navigation_poll).until(
+                expected_conditions.staleness_of(self.old_page))
+            remaining = timeout - (time.perf_counter() - self.start_time)
+            self.browser.set_script_timeout(max(remaining, navigation_poll))
+            self.browser.execute_async_script(ready_script)
+        except TimeoutException:
+            raise Exception('Timeout waiting for page load of {} after {:.1f}s'.format(
+                            "/".join(self.key), timeout))
+        history.record(self.key, time.perf_counter() - self.start_time)
+        return True
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.wait_for_load()
+        return False